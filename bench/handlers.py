@@ -0,0 +1,350 @@
+"""
+Benchmark full updates through the Telegram and WhatsApp handlers, end to end.
+
+The real handler functions of ``tg`` and ``wa`` are driven with fake clients and synthetic updates (inline queries,
+callback queries and messages), against an in-process ``bench.standin`` upstream and a temporary SQLite database.
+For every handler it reports the p50/p99 latency, the allocations (peak per update) and the DB / HTTP calls per
+update.
+
+Usage:
+    python -m bench.handlers                                    # 200 updates per handler, no upstream latency
+    python -m bench.handlers --latency lognormal:120,0.8 --iterations 500
+    python -m bench.handlers --only tg.read_book                # the handlers whose name starts with it
+"""
+import argparse
+import os
+import socket
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+# The settings are read on import, so the environment is set up before importing the bot
+TMP_DIR = Path(tempfile.mkdtemp(prefix="hb_bench_"))
+os.environ["SQLITE_FILE_PATH"] = str(TMP_DIR / "bot.sqlite")
+os.environ["HB_DISK_CACHE_PATH"] = str(TMP_DIR / "hb_cache.sqlite")
+os.environ["HB_SHAS_CATALOG_PATH"] = str(TMP_DIR / "shas_catalog.json")
+os.environ["HB_TURSA_INDEX_PATH"] = str(TMP_DIR / "tursa_index.json")
+for key, value in {
+    "LOG_LEVEL": "WARNING",
+    "UNDER_MAINTENANCE": "false",
+    "REPLY_UNDER_MAINTENANCE": "false",
+    "CONTACT_PHONE": "1",
+    "TG_API_ID": "1",
+    "TG_API_HASH": "bench",
+    "TG_BOT_TOKEN": "1:bench",
+    "TG_ADMINS": "[]",
+    "WA_TOKEN": "bench",
+    "WA_VERIFY_TOKEN": "bench",
+    "WA_CALLBACK_URL": "http://localhost",
+    "WA_APP_ID": "1",
+    "WA_APP_SECRET": "bench",
+    "WA_PHONE_NUMBER": "1",
+    "WA_PHONE_ID": "1",
+    "WA_ADMINS": "[]",
+    "HB_API_KEY": "bench",
+    "HB_PDF_FULL_LIMIT": '{"limit": 1000000, "minutes": 1}',
+    "HB_PDF_PAGE_LIMIT": '{"limit": 1000000, "minutes": 1}',
+    "HB_IMAGE_PAGE_LIMIT": '{"limit": 1000000, "minutes": 1}',
+}.items():
+    os.environ.setdefault(key, value)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_upstream(args: argparse.Namespace) -> dict[str, int]:
+    """
+    Run a ``bench.standin`` server in a background thread and point the bot at it
+
+    Returns:
+        The live counters of the stand-in
+    """
+    import uvicorn
+    from bench import standin
+
+    port = _free_port()
+    app = standin.create_app(
+        argparse.Namespace(
+            recordings=standin.RECORDINGS_DIR,
+            record=False,
+            upstream=standin.UPSTREAM,
+            latency=args.latency,
+            error_rate=args.error_rate,
+            error_status=503,
+            max_rps=None,
+            asset_kb=args.asset_kb,
+        )
+    )
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    os.environ["HB_BASE_URL"] = f"http://127.0.0.1:{port}"
+    return app.state.stats
+
+
+class FakeClient:
+    """Stands for the pyrogram ``Client`` / pywa ``WhatsApp``, and records the calls the handlers make to it"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def record(self, *_, **__) -> str:
+        self.calls += 1
+        return f"wamid.{self.calls}"
+
+
+class FakeTgMessage:
+    def __init__(
+        self, client: FakeClient, user_id: int, text: str, reply_to_message=None
+    ):
+        self._client = client
+        self.from_user = SimpleNamespace(id=user_id, language_code="en")
+        self.text = text
+        self.reply_to_message = reply_to_message
+        self.reply_text = self.reply = self.edit_text = client.record
+
+
+class FakeInlineQuery:
+    def __init__(self, client: FakeClient, user_id: int, query: str, offset: str = ""):
+        self.from_user = SimpleNamespace(id=user_id, language_code="en")
+        self.query = query
+        self.offset = offset
+        self.answer = client.record
+
+
+class FakeCallbackQuery:
+    def __init__(
+        self, client: FakeClient, user_id: int, data: str, reply_to: str | None = None
+    ):
+        self.from_user = SimpleNamespace(id=user_id, language_code="en")
+        self.data = data
+        # The message with the buttons, and the message it replies to (e.g. the search)
+        self.message = FakeTgMessage(
+            client,
+            user_id,
+            text="",
+            reply_to_message=FakeTgMessage(client, user_id, reply_to)
+            if reply_to
+            else None,
+        )
+        self.answer = self.edit_message_text = client.record
+
+
+def _fake_wa_update(cls: type, client: FakeClient, wa_id: str, **fields):
+    """
+    Build a pywa update without the webhook payload (the handlers check the update types with ``isinstance``)
+
+    Args:
+        cls: The pywa update type (e.g. ``Message``)
+        client: The fake ``WhatsApp`` client
+        wa_id: The id of the sender
+        **fields: The fields of the update (e.g. ``text``)
+    """
+    update = object.__new__(
+        type(
+            f"Fake{cls.__name__}",
+            (cls,),
+            {
+                "react": client.record,
+                "reply_text": client.record,
+                "reply_image": client.record,
+                "reply_document": client.record,
+            },
+        )
+    )
+    for name, value in {
+        "_client": client,
+        "from_user": SimpleNamespace(wa_id=wa_id, name="bench"),
+        **fields,
+    }.items():
+        object.__setattr__(update, name, value)
+    return update
+
+
+def get_scenarios(client: FakeClient, tg_id: int, wa_id: str, distinct: int) -> dict:
+    """
+    The benchmarked handlers, by name: the handler and a function that builds its i-th update
+
+    Args:
+        client: The fake client the updates reply through
+        tg_id: The id of the (registered) Telegram user
+        wa_id: The id of the (registered) WhatsApp user
+        distinct: The number of distinct updates per handler (the rest hit the caches)
+    """
+    from pywa.types import Message as WaMessage, CallbackButton
+    from data.callbacks import ReadBook, ShowBook, SearchNavigation
+    from data.enums import BookType, ReadMode
+    from tg import search as tg_search, utils as tg_utils
+    from wa import search as wa_search, utils as wa_utils
+
+    def book_id(i: int) -> int:
+        return 1000 + i % distinct
+
+    def read_book(i: int, book_type: BookType) -> ReadBook:
+        return ReadBook(
+            id=str(book_id(i) if book_type == BookType.BOOK else 1 + i % 37),
+            page=1 + i % 20,
+            total=0,
+            read_mode=ReadMode.IMAGE,
+            book_type=book_type,
+        )
+
+    return {
+        "tg.search_books_inline": (
+            tg_search.search_books_inline,
+            lambda i: FakeInlineQuery(client, tg_id, f"ספר {i % distinct}"),
+        ),
+        "tg.search_books_inline:id": (
+            tg_search.search_books_inline,
+            lambda i: FakeInlineQuery(client, tg_id, str(book_id(i))),
+        ),
+        "tg.search_books_message": (
+            tg_search.search_books_message,
+            lambda i: FakeTgMessage(client, tg_id, f"ספר {i % distinct}"),
+        ),
+        "tg.search_books_navigator": (
+            tg_search.search_books_navigator,
+            lambda i: FakeCallbackQuery(
+                client,
+                tg_id,
+                SearchNavigation(offset=6 + 5 * (i % 10), total=0).to_callback(),
+                reply_to=f"ספר {i % distinct}",
+            ),
+        ),
+        "tg.read_book": (
+            tg_utils.read_book,
+            lambda i: FakeCallbackQuery(
+                client,
+                tg_id,
+                read_book(i, BookType.BOOK).join_to_callback(ShowBook(id=book_id(i))),
+            ),
+        ),
+        "tg.read_book:masechet": (
+            tg_utils.read_book,
+            lambda i: FakeCallbackQuery(
+                client, tg_id, read_book(i, BookType.MASECHET).to_callback()
+            ),
+        ),
+        "wa.on_search": (
+            wa_search.on_search,
+            lambda i: _fake_wa_update(
+                WaMessage, client, wa_id, text=f"ספר {i % distinct}"
+            ),
+        ),
+        "wa.read_book": (
+            wa_utils.read_book,
+            lambda i: _fake_wa_update(
+                CallbackButton,
+                client,
+                wa_id,
+                data=read_book(i, BookType.BOOK).to_callback(),
+            ),
+        ),
+        "wa.read_book:masechet": (
+            wa_utils.read_book,
+            lambda i: _fake_wa_update(
+                CallbackButton,
+                client,
+                wa_id,
+                data=read_book(i, BookType.MASECHET).to_callback(),
+            ),
+        ),
+    }
+
+
+def run(handler, make_update, client: FakeClient, iterations: int, counters: dict):
+    """
+    Run a handler over ``iterations`` updates
+
+    Returns:
+        The latencies (in ms), the peak allocations of every update (in bytes), and the DB and HTTP calls per update
+    """
+    from data.rate_limit import limiter
+
+    latencies, peaks = [], []
+    db_calls, http_calls = counters["db"], counters["http"]["requests"]
+    for i in range(iterations):
+        update = make_update(i)
+        limiter.user_rates.clear()
+        start = time.perf_counter()
+        handler(client, update)
+        latencies.append((time.perf_counter() - start) * 1000)
+    db_calls, http_calls = (
+        counters["db"] - db_calls,
+        counters["http"]["requests"] - http_calls,
+    )
+    # A second pass with tracemalloc on, which slows everything down and would skew the latencies
+    tracemalloc.start()
+    for i in range(min(iterations, 50)):
+        update = make_update(iterations + i)
+        limiter.user_rates.clear()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        handler(client, update)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    return latencies, peaks, db_calls / iterations, http_calls / iterations
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument(
+        "--distinct", type=int, default=50, help="distinct updates per handler"
+    )
+    parser.add_argument(
+        "--only", default="", help="only the handlers that start with it"
+    )
+    parser.add_argument("--latency", default="0", help="e.g. lognormal:120,0.8 (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--asset-kb", type=int, default=150)
+    args = parser.parse_args()
+
+    counters = {"db": 0, "http": start_upstream(args)}
+
+    from sqlalchemy import event
+    from db import repository, tables
+
+    @event.listens_for(tables.engine, "before_cursor_execute")
+    def count_db_call(*_):
+        counters["db"] += 1
+
+    tg_id, wa_id = 1, "972500000000"
+    repository.add_tg_user(tg_id=tg_id, lang="en")
+    repository.add_wa_user(wa_id=wa_id, lang="en")
+    client = FakeClient()
+
+    print(f"upstream: {os.environ['HB_BASE_URL']} (latency {args.latency})")
+    print(
+        f"{'handler':<28}{'p50 ms':>9}{'p99 ms':>9}{'alloc KB':>10}{'db/upd':>8}{'http/upd':>10}"
+    )
+    for name, (handler, make_update) in get_scenarios(
+        client, tg_id, wa_id, args.distinct
+    ).items():
+        if not name.startswith(args.only):
+            continue
+        latencies, peaks, db, http = run(
+            handler, make_update, client, args.iterations, counters
+        )
+        print(
+            f"{name:<28}{percentile(latencies, 0.5):>9.2f}{percentile(latencies, 0.99):>9.2f}"
+            f"{sum(peaks) / len(peaks) / 1024:>10.0f}{db:>8.2f}{http:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
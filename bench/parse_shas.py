@@ -0,0 +1,169 @@
+"""
+Benchmark the targeted HTML parsing of ``data.scrape`` against parsing the whole page.
+
+Both parsers must extract the same data (what ``data.aioapi`` reads from the page), or the benchmark fails.
+
+The fixtures in ``bench/fixtures`` follow the markup of HebrewBooks.org (``--record`` replaces them with the live
+pages).
+
+Usage:
+    python -m bench.parse_shas             # over the saved fixtures (or synthetic pages if there are none)
+    python -m bench.parse_shas --record    # save fresh fixtures from HebrewBooks.org first
+"""
+import argparse
+import base64
+import os
+import time
+import tracemalloc
+from pathlib import Path
+from bs4 import BeautifulSoup
+from data import scrape
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+# fixture name -> (path on HebrewBooks.org, strainer, element to find)
+PAGES = {
+    "shas": ("/shas.aspx", scrape.MASECHTOT, ("select", {"id": "cpMstr_ddlMesechtas"})),
+    "masechet": (
+        "/shas.aspx?mesechta=1",
+        scrape.MASECHET,
+        ("select", {"id": "cpMstr_ddlDafim"}),
+    ),
+    "page": (
+        "/shas.aspx?mesechta=1&daf=2&format=text",
+        scrape.PAGE_TEXT,
+        ("div", {"class": "shastext2"}),
+    ),
+    "tursa": ("/tursa", scrape.TURSA_MENU, ("div", {"id": "menu0"})),
+}
+
+
+def _options(soup: BeautifulSoup, select_id: str) -> list[tuple[str, str]]:
+    return [
+        (o["value"], o.text)
+        for o in soup.find("select", {"id": select_id}).find_all("option")
+    ]
+
+
+def _sections(soup: BeautifulSoup, cls: str, tag: str, **attrs) -> list[str]:
+    return [
+        f"{e.text}|{e.next_sibling}"
+        for e in soup.find("div", class_=cls).find_all(tag, **attrs)
+    ]
+
+
+# fixture name -> the data that data.aioapi extracts from the page
+EXTRACT = {
+    "shas": lambda soup: _options(soup, "cpMstr_ddlMesechtas"),
+    "masechet": lambda soup: (
+        soup.find("div", {"id": "shaspngcont"}).get("rel"),
+        _options(soup, "cpMstr_ddlDafim"),
+    ),
+    "page": lambda soup: (
+        _sections(soup, "shastext2", "span"),
+        _sections(soup, "shastext3", "span", class_="five"),
+        _sections(soup, "shastext4", "span", class_="five"),
+    ),
+    "tursa": lambda soup: [
+        (li["id"], li.text.strip())
+        for li in soup.find("div", {"id": "menu0"}).find_all("li")
+    ],
+}
+
+
+def record():
+    """Save the pages from HebrewBooks.org as fixtures"""
+    import httpx
+    from data.aioapi import BASE_API, HEADERS
+
+    FIXTURES_DIR.mkdir(exist_ok=True)
+    for name, (path, _, _) in PAGES.items():
+        res = httpx.get(f"{BASE_API}{path}", headers=HEADERS, timeout=30)
+        res.raise_for_status()
+        (FIXTURES_DIR / f"{name}.html").write_text(res.text, encoding="utf-8")
+        print(f"recorded {name} ({len(res.text):,} chars)")
+
+
+def synthesize(name: str) -> str:
+    """Build a synthetic page with the same shape as the real one (big viewstate, menus, the elements we need)"""
+    chrome = "".join(
+        f'<li><a href="/section{i}.aspx" class="menu">קטגוריה {i}</a></li>'
+        for i in range(400)
+    )
+    viewstate = base64.b64encode(os.urandom(120_000)).decode()
+    options = "".join(f'<option value="{i}">מסכת {i}</option>' for i in range(1, 38))
+    dafim = "".join(
+        f'<option value="{d}{a}">{d}{a}</option>'
+        for d in range(2, 160)
+        for a in ("", "b")
+    )
+    text = "".join(f'<span>דיבור {i}</span> {"מילה " * 40}<br/>' for i in range(60))
+    tosfot = "".join(
+        f'<div><span class="shastitle7">תוס׳</span><span class="five">ד״ה {i}</span> {"מילה " * 30}</div>'
+        for i in range(20)
+    )
+    body = {
+        "shas": f'<select id="cpMstr_ddlMesechtas">{options}</select>',
+        "masechet": f'<div id="shaspngcont" rel="36342_3"></div><select id="cpMstr_ddlDafim">{dafim}</select>',
+        "page": f'<div class="shastext2">{text}</div><div class="shastext3">{text.replace("<span>", "<span class=five>")}</div>'
+        f'<div class="shastext4">{tosfot}</div>',
+        "tursa": '<div id="menu0"><ul>'
+        + "".join(f'<li id="t{i}">סימן {i}</li>' for i in range(30))
+        + "</ul></div>",
+    }[name]
+    return (
+        f'<html><head><title>HebrewBooks</title></head><body><form><input type="hidden" name="__VIEWSTATE" '
+        f'value="{viewstate}"/><ul class="nav">{chrome}</ul><div class="content">{body}</div>'
+        f'<div class="footer">{chrome}</div></form></body></html>'
+    )
+
+
+def measure(func, iterations: int) -> tuple[float, int]:
+    """Return the mean time in ms, and the peak memory of one call in bytes"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = (time.perf_counter() - start) / iterations * 1000
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--record", action="store_true", help="save fresh fixtures first"
+    )
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    if args.record:
+        record()
+    print(f"parser: {scrape.PARSER}")
+    print(
+        f"{'page':<10}{'source':<11}{'full ms':>9}{'full MB':>9}{'target ms':>11}{'target MB':>11}{'speedup':>9}"
+    )
+    for name, (_, strainer, (tag, attrs)) in PAGES.items():
+        fixture = FIXTURES_DIR / f"{name}.html"
+        if fixture.exists():
+            html, source = fixture.read_text(encoding="utf-8"), "fixture"
+        else:
+            html, source = synthesize(name), "synthetic"
+        full = EXTRACT[name](BeautifulSoup(html, "html.parser"))
+        targeted = EXTRACT[name](scrape.parse(html, strainer))
+        assert full == targeted, f"{name}: the targeted parse extracted other data"
+        full_ms, full_peak = measure(
+            lambda: BeautifulSoup(html, "html.parser").find(tag, attrs), args.iterations
+        )
+        target_ms, target_peak = measure(
+            lambda: scrape.parse(html, strainer).find(tag, attrs), args.iterations
+        )
+        print(
+            f"{name:<10}{source:<11}{full_ms:>9.1f}{full_peak / 2**20:>9.1f}"
+            f"{target_ms:>11.1f}{target_peak / 2**20:>11.1f}{full_ms / target_ms:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
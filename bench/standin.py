@@ -0,0 +1,335 @@
+"""
+Offline stand-in for HebrewBooks.org, to load-test and benchmark the bot without hitting the real site.
+
+It serves the recorded responses of ``api.ashx``, ``shas.aspx``, ``generic.aspx``, ``tursa``, ``suggest.ashx`` and
+the page PNGs and PDFs, and synthetic responses (with the same shape) for whatever wasn't recorded. The upstream
+conditions are configurable: latency distribution, error rate and throughput cap. The recorded validators (``ETag``
+/ ``Last-Modified``) are replayed, and a conditional request that matches them is answered with a 304, like upstream.
+
+Usage:
+    python -m bench.standin                                     # replay the recordings, synthesize the rest
+    python -m bench.standin --record                            # proxy to HebrewBooks.org and record the responses
+    python -m bench.standin --latency lognormal:120,0.8 --error-rate 0.02 --max-rps 30
+
+    HB_BASE_URL=http://127.0.0.1:8081 python3 tg/app.py                     # point the Telegram bot at it
+    HB_BASE_URL=http://127.0.0.1:8081 uvicorn wa.app:fastapi_app            # point the WhatsApp bot at it
+
+The latency specs (in ms): ``fixed:MS``, ``uniform:LOW,HIGH`` or ``lognormal:MEDIAN,SIGMA``. The counters of the
+served responses are at ``/_standin/stats``.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Callable
+from urllib.parse import urlencode
+from fastapi import FastAPI, Request, Response
+from bench.parse_shas import synthesize as synthesize_page
+
+RECORDINGS_DIR = Path(__file__).parent / "recordings"
+UPSTREAM = "https://beta.hebrewbooks.org"
+SEARCH_TOTAL = 437  # The total of every synthetic search / browse
+VALIDATORS = ("ETag", "Last-Modified")  # The recorded response headers
+
+
+class Recordings:
+    """The recorded responses: an index of request key -> (status, content type, body file, validators)"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.index_path = path / "index.json"
+        self.index: dict[str, dict] = (
+            json.loads(self.index_path.read_text(encoding="utf-8"))
+            if self.index_path.exists()
+            else {}
+        )
+
+    def get(self, key: str) -> tuple[int, str, bytes, dict[str, str]] | None:
+        """Get a recorded response (status, content type, body, validators), None if it wasn't recorded"""
+        if (entry := self.index.get(key)) is None:
+            return None
+        body = (self.path / entry["file"]).read_bytes()
+        return entry["status"], entry["content_type"], body, entry.get("headers", {})
+
+    def add(
+        self,
+        key: str,
+        status: int,
+        content_type: str,
+        body: bytes,
+        headers: dict[str, str],
+    ):
+        """Record a response"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        file = hashlib.sha1(key.encode()).hexdigest()
+        (self.path / file).write_bytes(body)
+        self.index[key] = {
+            "status": status,
+            "content_type": content_type,
+            "file": file,
+            "headers": headers,
+        }
+        self.index_path.write_text(
+            json.dumps(self.index, ensure_ascii=False, indent=1), encoding="utf-8"
+        )
+
+
+def request_key(path: str, params: dict[str, str]) -> str:
+    """The key of a request: the path and the sorted params, without the api key"""
+    params = sorted((k, v) for k, v in params.items() if k != "api_key")
+    return f"/{path}?{urlencode(params)}"
+
+
+def not_modified(request: Request, headers: dict[str, str]) -> bool:
+    """
+    Whether a conditional request matches the validators of the response (so it's answered with a 304)
+
+    Args:
+        request: The request (``If-None-Match`` / ``If-Modified-Since``)
+        headers: The validators of the response (``ETag`` / ``Last-Modified``)
+    """
+    if (etags := request.headers.get("if-none-match")) is not None:
+        if (etag := headers.get("ETag")) is None:
+            return False
+        return etags.strip() == "*" or etag.removeprefix("W/") in (
+            t.strip().removeprefix("W/") for t in etags.split(",")
+        )
+    since = request.headers.get("if-modified-since")
+    modified = headers.get("Last-Modified")
+    if not since or not modified:
+        return False
+    try:
+        return parsedate_to_datetime(modified) <= parsedate_to_datetime(since)
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    Parse a latency spec into a function that draws a latency in seconds
+
+    Args:
+        spec: ``fixed:MS``, ``uniform:LOW,HIGH`` or ``lognormal:MEDIAN,SIGMA`` (in ms), or ``0``
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",")] if args else []
+    match kind:
+        case "0" | "none":
+            return lambda: 0.0
+        case "fixed":
+            return lambda: values[0] / 1000
+        case "uniform":
+            return lambda: random.uniform(*values) / 1000
+        case "lognormal":
+            return lambda: random.lognormvariate(math.log(values[0]), values[1]) / 1000
+    raise ValueError(f"Invalid latency spec: {spec}")
+
+
+class Throttle:
+    """Cap the throughput with a token bucket, the requests over the cap wait for their turn (like a busy upstream)"""
+
+    def __init__(self, max_rps: float | None):
+        self.max_rps = max_rps
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.max_rps:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + 1 / self.max_rps
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def jsonp(params: dict[str, str], obj) -> tuple[int, str, bytes]:
+    body = f"{params.get('callback', 'bot')}({json.dumps(obj, ensure_ascii=False)})"
+    return 200, "application/javascript; charset=utf-8", body.encode()
+
+
+def html(body: str) -> tuple[int, str, bytes]:
+    return 200, "text/html; charset=utf-8", f"<html><body>{body}</body></html>".encode()
+
+
+def synthesize(path: str, params: dict[str, str], asset_size: int):
+    """
+    Build a synthetic response with the same shape as the real one
+
+    Returns:
+        The status, the content type and the body
+    """
+    if path == "api/api.ashx":
+        req = params.get("req")
+        if req == "book_info":
+            book_id = int(params["id"])
+            return jsonp(
+                params,
+                {
+                    "id": book_id,
+                    "title": f"ספר {book_id}",
+                    "author": "מחבר",
+                    "city": "ירושלים",
+                    "year": "תרפ״ה",
+                    "pages": 50 + book_id % 400,
+                    "new_reader_available": "true",
+                },
+            )
+        if req == "subject_list":
+            return jsonp(
+                params,
+                [
+                    {"id": str(i) if params.get("type") == "letter" else i}
+                    | {"name": f"{params.get('type')} {i}", "total": 10 + i * 7}
+                    for i in range(1, 23)
+                ],
+            )
+        start, length = int(params.get("start", 1)), int(params.get("length", 10))
+        return jsonp(
+            params,
+            {
+                "data": [
+                    {"id": str(100_000 + i), "title": f"ספר {i}"}
+                    for i in range(start, min(start + length, SEARCH_TOTAL + 1))
+                ],
+                "total": SEARCH_TOTAL,
+            },
+        )
+    if path == "suggest/suggest.ashx":
+        q, limit = params.get("q", ""), int(params.get("limit", 10))
+        # Longer queries have fewer suggestions, like the real ones
+        count = min(limit, max(0, 15 - 3 * len(q)))
+        return (
+            200,
+            "application/json",
+            json.dumps([f"{q}{i}" for i in range(count)]).encode(),
+        )
+    if path == "shas.aspx":
+        if "daf" in params:
+            return 200, "text/html; charset=utf-8", synthesize_page("page").encode()
+        if "mesechta" in params:
+            masechet = int(params["mesechta"])
+            dafim = "".join(
+                f'<option value="{d}{a}">{d}{a}</option>'
+                for d in range(2, 20 + masechet * 3)
+                for a in ("", "b")
+            )
+            return html(
+                f'<div id="shaspngcont" rel="{36_000 + masechet}_3"></div>'
+                f'<select id="cpMstr_ddlDafim">{dafim}</select>'
+            )
+        options = "".join(
+            f'<option value="{i}">מסכת {i}</option>' for i in range(1, 38)
+        )
+        return html(f'<select id="cpMstr_ddlMesechtas">{options}</select>')
+    if path == "tursa":
+        items = "".join(f'<li id="t{i}">חלק {i}</li>' for i in range(1, 5))
+        return html(f'<div id="menu0"><ul>{items}</ul></div>')
+    if path == "generic.aspx":
+        tursa = params.get("tursa", "")
+        depth = tursa.count("_")
+        items = [
+            {"id": f"{tursa}_{i}", "text": f"סימן {i}", "prefix": "" if depth else "א"}
+            for i in range(1, 11)
+        ]
+        return 200, "application/json", json.dumps(items, ensure_ascii=False).encode()
+    if path.endswith(".pdf"):
+        return 200, "application/pdf", b"%PDF-1.4\n" + b"0" * asset_size
+    if path.endswith(".png"):
+        return 200, "image/png", b"\x89PNG\r\n\x1a\n" + b"0" * asset_size
+    return 404, "text/plain", b"not found"
+
+
+def create_app(args: argparse.Namespace) -> FastAPI:
+    """Create the stand-in server"""
+    import httpx
+
+    app = FastAPI()
+    app.state.stats = stats = {
+        "requests": 0,
+        "recorded": 0,
+        "replayed": 0,
+        "synthetic": 0,
+        "not_modified": 0,
+        "errors": 0,
+    }
+    recordings = Recordings(args.recordings)
+    latency = parse_latency(args.latency)
+    throttle = Throttle(args.max_rps)
+    upstream = (
+        httpx.AsyncClient(base_url=args.upstream, timeout=60) if args.record else None
+    )
+
+    @app.get("/_standin/stats")
+    async def get_stats():
+        return stats
+
+    @app.get("/{path:path}")
+    async def serve(path: str, request: Request):
+        stats["requests"] += 1
+        await throttle.acquire()
+        await asyncio.sleep(latency())
+        if random.random() < args.error_rate:
+            stats["errors"] += 1
+            return Response(status_code=args.error_status)
+        params = dict(request.query_params)
+        key = request_key(path, params)
+        if (response := recordings.get(key)) is not None:
+            stats["replayed"] += 1
+        elif upstream is not None:
+            res = await upstream.get(f"/{path}", params=params)
+            response = (
+                res.status_code,
+                res.headers.get("content-type", ""),
+                res.content,
+                {h: res.headers[h] for h in VALIDATORS if h in res.headers},
+            )
+            recordings.add(key, *response)
+            stats["recorded"] += 1
+        else:
+            response = (*synthesize(path, params, args.asset_kb * 1024), {})
+            stats["synthetic"] += 1
+        status, content_type, body, headers = response
+        if status == 200 and not_modified(request, headers):
+            stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        return Response(
+            content=body, status_code=status, media_type=content_type, headers=headers
+        )
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline HebrewBooks.org stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--recordings", type=Path, default=RECORDINGS_DIR)
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="proxy the misses upstream and record them",
+    )
+    parser.add_argument("--upstream", default=UPSTREAM)
+    parser.add_argument("--latency", default="0", help="e.g. lognormal:120,0.8 (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--max-rps", type=float, default=None, help="throughput cap")
+    parser.add_argument(
+        "--asset-kb", type=int, default=150, help="synthetic PNG / PDF size"
+    )
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
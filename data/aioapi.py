@@ -0,0 +1,862 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import weakref
+from dataclasses import fields, MISSING
+from functools import lru_cache
+from urllib.parse import urlencode
+from typing import Literal, Coroutine, Any, TypeVar, Iterable, Callable
+import httpx
+from bs4 import BeautifulSoup, SoupStrainer
+from data.enums import BrowseType
+from .config import get_settings
+from data.models import (
+    Letter,
+    DateRange,
+    Subject,
+    Book,
+    SearchResults,
+    MasechetBase,
+    Masechet,
+    MasechetPage,
+    PageContent,
+    Tursa,
+)
+from data import (
+    helpers,
+    metrics,
+    resilience,
+    scrape,
+    shas_catalog,
+    suggestions,
+    tursa_index,
+)
+from data.singleflight import SingleFlight
+from data.disk_cache import DiskCache
+from data.api_cache import cached, TTLCache, get_policy
+
+logger = logging.getLogger(__name__)
+
+"""
+Asyncio-native HebrewBooks.org client.
+
+All the upstream requests are sent through a pooled ``httpx.AsyncClient``, so one process can keep many requests in
+flight at once. The blocking functions in ``data.api`` are thin wrappers around the coroutines in this module, they
+run them on a background event loop (see ``run_sync``).
+"""
+
+conf = get_settings()
+BASE_API = conf.hb_base_url
+api_key = {"api_key": conf.hb_api_key}
+HEADERS = {"User-Agent": "HebrewBooksBot/1.0"}
+LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=50)
+BOOKS_FAN_OUT = 10  # Max concurrent book_info requests of a single get_books call
+# Search and browse results are fetched in aligned blocks of this size, see ``_get_window``
+SEARCH_BLOCK_SIZE = 50
+WARM_TIMEOUT = 30  # Seconds, page assets may take a while to render upstream
+
+# How long (in seconds) to keep each kind of response on disk, None to keep it until it's evicted
+DISK_CACHE_TTLS: dict[str, int | None] = {
+    "book_info": 30 * 24 * 60 * 60,
+    "subject_list": 60 * 60,  # The totals change, see the catalogs cache policies
+    "title_list_for_subject": 24 * 60 * 60,
+    "search": 6 * 60 * 60,
+    "suggest": 24 * 60 * 60,
+    "shas.aspx": None,
+    "tursa": None,
+}
+
+# The timeouts of each kind of request, the pages are rendered upstream and the search is slow
+DEFAULT_TIMEOUT = httpx.Timeout(10, connect=3)
+TIMEOUTS: dict[str, httpx.Timeout] = {
+    "book_info": httpx.Timeout(5, connect=3),
+    "suggest": httpx.Timeout(3, connect=2),
+    "search": httpx.Timeout(15, connect=3),
+    "title_list_for_subject": httpx.Timeout(15, connect=3),
+    "shas.aspx": httpx.Timeout(20, connect=3),
+}
+MAX_RETRIES = 2  # Per request, as long as resilience.retry_budget allows it
+# The response validators, and the request headers that send them back
+VALIDATORS = {"ETag": "If-None-Match", "Last-Modified": "If-Modified-Since"}
+
+T = TypeVar("T")
+
+# httpx clients are bound to the event loop they were created in
+_clients: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, httpx.AsyncClient
+] = weakref.WeakKeyDictionary()
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+requests_flight = SingleFlight()
+# Set while the prebuilt files are built (see ``data.persisted``): the requests ask upstream even if their response
+# is cached on disk (with its validators, so an unchanged response is a cheap 304), and never serve a stale one
+revalidating: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "revalidating", default=False
+)
+# Parsed JSON responses by the hash of their body, see ``_send_request``
+parsed_cache = TTLCache(get_policy("parsed"))
+disk_cache = (
+    DiskCache(conf.hb_disk_cache_path, max_bytes=conf.hb_disk_cache_max_mb * 2**20)
+    if conf.hb_disk_cache_path
+    else None
+)
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Get the pooled client of the running event loop"""
+    loop = asyncio.get_running_loop()
+    if (client := _clients.get(loop)) is None:
+        client = _clients[loop] = httpx.AsyncClient(headers=HEADERS, limits=LIMITS)
+    return client
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Get (and start on first use) the background event loop used by ``run_sync``"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="hebrewbooks-api", daemon=True
+            ).start()
+    return _loop
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    Run a coroutine on the background event loop and block until it's done.
+
+    - Do not call it from a running event loop, ``await`` the coroutine instead.
+
+    Args:
+        coro: The coroutine to run (e.g. ``get_book(1)``)
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+def run_background(coro: Coroutine[Any, Any, T]) -> concurrent.futures.Future[T]:
+    """
+    Schedule a coroutine on the background event loop, without waiting for it.
+
+    Args:
+        coro: The coroutine to run (e.g. ``prefetch.warm(urls)``)
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+
+async def _make_request(
+    endpoint: str,
+    params: dict[str, str | int] | None = None,
+    convert_to: str | None = None,
+    model: type | None = None,
+) -> dict | list | str:
+    """
+    Make a request to HebrewBooks.org
+
+    The raw responses are kept in ``disk_cache`` (if enabled), so they survive restarts. Concurrent identical
+    requests (same endpoint, params and conversion) share one call and its parsed result, see ``requests_flight``
+    for the counters.
+
+    Args:
+        endpoint: The endpoint to send the request to (e.g. '/search')
+        params: The parameters to send (e.g. {'searchtype': 'all', 'search': 'אבגדה'})
+        convert_to: The type to convert the response to (either 'dict', 'list' or 'html')
+        model: A dataclass to decode the JSON objects that have all its fields into (e.g. ``Book``)
+    """
+    if params is None:
+        params = {}
+    revalidate = revalidating.get()
+    return await requests_flight.ado(
+        (endpoint, tuple(sorted(params.items())), convert_to, model, revalidate),
+        _send_request,
+        endpoint,
+        params,
+        convert_to,
+        model,
+        revalidate,
+    )
+
+
+def _endpoint_name(endpoint: str, params: dict[str, str | int]) -> str:
+    """Get the logical name of a request (e.g. 'book_info', 'search', 'shas.aspx' or 'tursa')"""
+    if endpoint == "/api/api.ashx":
+        return str(params.get("req", "search"))
+    return {
+        "/suggest/suggest.ashx": "suggest",
+        "/shas.aspx": "shas.aspx",
+        "/tursa": "tursa",
+        "/generic.aspx": "tursa",
+    }.get(endpoint, endpoint)
+
+
+@lru_cache
+def _get_decoder(model: type | None) -> json.JSONDecoder:
+    """Get a JSON decoder that builds ``model`` instances from the objects that have all its fields"""
+    if model is None:
+        return json.JSONDecoder()
+    required = frozenset(
+        f.name
+        for f in fields(model)
+        if f.default is MISSING and f.default_factory is MISSING
+    )
+    return json.JSONDecoder(
+        object_hook=lambda obj: model(**obj) if obj.keys() >= required else obj
+    )
+
+
+def _decode_json(body: bytes, start: str | None, model: type | None) -> Any:
+    """
+    Decode a JSON or a JSONP (e.g. ``bot({...})``) response
+
+    The JSON is decoded in place from ``start`` (the wrapper isn't sliced off into another copy of the text), and
+    the objects are built into ``model`` while decoding (no intermediate list of dicts).
+
+    Args:
+        body: The raw response
+        start: The first char of the JSON ('{' or '['), None if the response is plain JSON
+        model: The dataclass to decode the matching objects into
+    """
+    # A BOM or leading whitespace is skipped like ``json.loads(bytes)`` does (``raw_decode`` doesn't)
+    text = body.decode("utf-8-sig")
+    idx = text.index(start) if start else json.decoder.WHITESPACE.match(text, 0).end()
+    return _get_decoder(model).raw_decode(text, idx)[0]
+
+
+async def _disk(name: str, method: Callable, *args, default: Any = None, **kwargs):
+    """
+    Call a ``disk_cache`` method off the event loop (SQLite calls block, and may wait for the write lock of another
+    process). A broken cache (locked, disk full, corrupt) only costs the cache: the error is logged and ``default`` is
+    returned, so a read is a miss and a write is skipped.
+    """
+    try:
+        return await asyncio.to_thread(method, *args, **kwargs)
+    except sqlite3.Error as e:
+        logger.warning(
+            f"{name}: disk cache {method.__name__} failed: {resilience.describe(e)}"
+        )
+        return default
+
+
+async def _send_request(
+    endpoint: str,
+    params: dict[str, str | int],
+    convert_to: str | None,
+    model: type | None,
+    revalidate: bool = False,
+) -> dict | list | str:
+    """
+    Get the response of ``_make_request`` from the disk cache or from upstream, and parse it
+
+    An expired response is revalidated with its validators (``ETag`` / ``Last-Modified``), so if it didn't change
+    upstream answers with a cheap 304 and only its TTL is renewed. If upstream is unhealthy (see
+    ``data.resilience``), the last known good response is served from the disk cache, even if it's expired.
+    """
+    name = _endpoint_name(endpoint, params)
+    key = f"{endpoint}?{urlencode(sorted(params.items()))}"
+    outcome = "hit"
+    if (
+        disk_cache is None
+        or revalidate
+        or (body := await _disk(name, disk_cache.get, key)) is None
+    ):
+        outcome = "miss"
+        ttl = DISK_CACHE_TTLS.get(name)
+        validators = (
+            await _disk(name, disk_cache.get_validators, key)
+            if disk_cache is not None
+            else None
+        )
+        try:
+            body, new_validators = await _fetch(
+                endpoint, params, convert_to, validators
+            )
+            if body is None:
+                # Not modified, unless it was evicted in the meantime
+                if disk_cache is not None and await _disk(
+                    name, disk_cache.touch, key, ttl, default=False
+                ):
+                    body = await _disk(name, disk_cache.get, key)
+                    outcome = "revalidated"
+                if body is None:
+                    body, new_validators = await _fetch(
+                        endpoint, params, convert_to, None
+                    )
+                    outcome = "miss"
+        except Exception as e:
+            if (
+                revalidate
+                or not resilience.is_failure(e)
+                or disk_cache is None
+                or (body := await _disk(name, disk_cache.get, key, stale=True)) is None
+            ):
+                raise
+            logger.warning(
+                f"{name}: {resilience.describe(e)}, serving a stale response"
+            )
+            outcome = "stale"
+        else:
+            if disk_cache is not None and outcome == "miss":
+                await _disk(
+                    name, disk_cache.set, key, body, ttl=ttl, validators=new_validators
+                )
+    metrics.count_disk_cache(name, outcome)
+    if convert_to == "html":
+        return body.decode()
+    # Identical payloads (e.g. a revalidated response) reuse the objects they were parsed into (a JSON ``null`` is
+    # just parsed again)
+    parsed_key = (hashlib.blake2b(body, digest_size=16).digest(), convert_to, model)
+    if (parsed := parsed_cache.get(parsed_key)) is None:
+        started = time.perf_counter()
+        start = "[" if convert_to == "list" else "{" if convert_to == "dict" else None
+        parsed = _decode_json(body, start=start, model=model)
+        metrics.observe_decode(name, time.perf_counter() - started)
+        parsed_cache.set(parsed_key, parsed)
+    return parsed
+
+
+async def _fetch(
+    endpoint: str,
+    params: dict[str, str | int],
+    convert_to: str | None,
+    validators: dict[str, str] | None,
+) -> tuple[bytes | None, dict[str, str]]:
+    """
+    Get a response body from upstream, with the endpoint timeouts, retries and circuit breaker
+
+    Args:
+        endpoint: The endpoint to send the request to
+        params: The parameters to send
+        convert_to: The type the response will be converted to
+        validators: The validators of the cached response, to make the request conditional
+    Returns:
+        The body (None if it's not modified) and its validators
+    """
+    name = _endpoint_name(endpoint, params)
+    breaker = resilience.get_breaker(name)
+    resilience.retry_budget.deposit()
+    headers = {
+        header: validators[validator]
+        for validator, header in VALIDATORS.items()
+        if validators and validator in validators
+    }
+    attempt = 0
+    while True:
+        breaker.check()
+        started = time.perf_counter()
+        try:
+            res = await _get_client().get(
+                f"{BASE_API}{endpoint}",
+                params={**params, **api_key},
+                headers=headers,
+                timeout=TIMEOUTS.get(name, DEFAULT_TIMEOUT),
+            )
+            metrics.observe_network(
+                name, time.perf_counter() - started, res.status_code, len(res.content)
+            )
+            if res.status_code in resilience.RETRIABLE_STATUSES:
+                res.raise_for_status()
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            if isinstance(e, httpx.TransportError):
+                metrics.observe_network(
+                    name, time.perf_counter() - started, type(e).__name__
+                )
+            breaker.record_failure()
+            if attempt >= MAX_RETRIES or not resilience.retry_budget.withdraw():
+                raise
+            attempt += 1
+            logger.info(
+                f"{name}: {resilience.describe(e)}, retry {attempt}/{MAX_RETRIES}"
+            )
+            await asyncio.sleep(resilience.backoff(attempt))
+            continue
+        breaker.record_success()
+        new_validators = {v: res.headers[v] for v in VALIDATORS if v in res.headers}
+        if res.status_code == 304:
+            return None, new_validators or validators or {}
+        res.raise_for_status()
+        # JSON is UTF-8, the html is normalized to UTF-8 with the charset of the response
+        body = res.text.encode() if convert_to == "html" else res.content
+        return body, new_validators
+
+
+def _parse(name: str, html: str, only: SoupStrainer) -> BeautifulSoup:
+    """Parse a scraped page (see ``scrape.parse``), and record how long it took in ``name`` metrics"""
+    started = time.perf_counter()
+    soup = scrape.parse(html, only)
+    metrics.observe_parse(name, time.perf_counter() - started)
+    return soup
+
+
+@cached("letters")
+async def get_letters() -> list[Letter]:
+    """Get all letters from HebrewBooks.org"""
+    return await _make_request(
+        endpoint="/api/api.ashx",
+        params={"req": "subject_list", "type": "letter", "callback": "bot"},
+        convert_to="list",
+        model=Letter,
+    )
+
+
+@cached("date_ranges")
+async def get_date_ranges() -> list[DateRange]:
+    """Get all date ranges from HebrewBooks.org"""
+    return await _make_request(
+        endpoint="/api/api.ashx",
+        params={"req": "subject_list", "type": "daterange", "callback": "bot"},
+        convert_to="list",
+        model=DateRange,
+    )
+
+
+@cached("subjects")
+async def get_subjects() -> list[Subject]:
+    """Get all subjects from HebrewBooks.org"""
+    return await _make_request(
+        endpoint="/api/api.ashx",
+        params={"req": "subject_list", "type": "subject", "callback": "bot"},
+        convert_to="list",
+        model=Subject,
+    )
+
+
+@cached("book")
+async def get_book(book_id: int) -> Book | None:
+    """
+    Get book information from HebrewBooks.org
+
+    Args:
+        book_id: The book's ID
+
+    Returns:
+        Book: The book's information
+    """
+    try:
+        book = await _make_request(
+            endpoint="/api/api.ashx",
+            params={"req": "book_info", "id": book_id, "callback": "bot"},
+            convert_to="dict",
+            model=Book,
+        )
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 400:
+            return None
+        raise
+    except ValueError:
+        return None
+    return book if isinstance(book, Book) else None
+
+
+async def get_books(book_ids: Iterable[int]) -> list[Book | None]:
+    """
+    Get the information of many books from HebrewBooks.org at once
+
+    The books that are not cached yet are fetched concurrently (up to ``BOOKS_FAN_OUT`` requests at a time) and
+    stored in the ``get_book`` cache.
+
+    Args:
+        book_ids: The books IDs
+
+    Returns:
+        list[Book | None]: The books, in the same order as ``book_ids``
+    """
+    book_ids = list(book_ids)
+    semaphore = asyncio.Semaphore(BOOKS_FAN_OUT)
+
+    async def fetch(book_id: int) -> Book | None:
+        async with semaphore:
+            return await get_book(book_id)
+
+    unique_ids = list(dict.fromkeys(book_ids))
+    books = dict(zip(unique_ids, await asyncio.gather(*(fetch(i) for i in unique_ids))))
+    return [books[i] for i in book_ids]
+
+
+async def _get_window(
+    get_block: Callable[[int], Coroutine[Any, Any, tuple[list[T], int]]],
+    offset: int,
+    limit: int,
+) -> tuple[list[T], int]:
+    """
+    Slice an ``(offset, limit)`` window out of the ``SEARCH_BLOCK_SIZE`` aligned blocks of a query
+
+    Every platform pages with a different size, so the results are fetched (and cached) in fixed blocks, and all
+    the windows of a query share them.
+
+    Args:
+        get_block: A coroutine function that gets the start of a block and returns its results and the total
+        offset: The offset to start from (1-based)
+        limit: The number of results to return
+    """
+    offset = max(offset, 1)
+    first = (offset - 1) // SEARCH_BLOCK_SIZE * SEARCH_BLOCK_SIZE + 1
+    block, total = await get_block(first)
+    results = list(block)
+    # The window may cross into the next blocks
+    start = first + SEARCH_BLOCK_SIZE
+    while len(block) == SEARCH_BLOCK_SIZE and start < min(offset + limit, total + 1):
+        block, _ = await get_block(start)
+        results.extend(block)
+        start += SEARCH_BLOCK_SIZE
+    skip = offset - first
+    return results[skip : skip + limit], total
+
+
+@cached("search")
+async def _search_block(
+    title: str, author: str, start: int
+) -> tuple[list[SearchResults], int]:
+    """Get a block of search results (see ``search``)"""
+    try:
+        data = await _make_request(
+            endpoint="/api/api.ashx",
+            params={
+                "author_search": author,
+                "title_search": title,
+                "start": start,
+                "length": SEARCH_BLOCK_SIZE,
+                "callback": "bot",
+            },
+            convert_to="dict",
+            model=SearchResults,
+        )
+    except ValueError:
+        return [], 0
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code in (400, 500):
+            return [], 0
+        raise
+    return data["data"], data["total"]
+
+
+async def search(
+    title: str, author: str, offset: int, limit: int
+) -> tuple[list[SearchResults], int]:
+    """
+    Search for books on HebrewBooks.org
+
+    Args:
+        title: The book's title
+        author: The book's author
+        offset: The offset to start from
+        limit: The number of results to return
+    Returns:
+        tuple[list[SearchResults], int]: The search results and the total number of results
+    """
+    if not any((title, author)):
+        raise ValueError("You must specify a title or author")
+    return await _get_window(
+        lambda start: _search_block(title, author, start), offset, limit
+    )
+
+
+@cached("browse")
+async def _browse_block(
+    browse_type: BrowseType, browse_id: int | str, start: int
+) -> tuple[list[SearchResults], int]:
+    """Get a block of browse results (see ``browse``)"""
+    data = await _make_request(
+        endpoint="/api/api.ashx",
+        params={
+            "req": "title_list_for_subject",
+            "list_type": browse_type.value,
+            "id": browse_id,
+            "start": start,
+            "length": SEARCH_BLOCK_SIZE,
+            "callback": "bot",
+        },
+        convert_to="dict",
+        model=SearchResults,
+    )
+    return data["data"], data["total"]
+
+
+async def browse(
+    browse_type: Literal[BrowseType.LETTER, BrowseType.DATERANGE, BrowseType.SUBJECT],
+    browse_id: int | str,
+    offset: int,
+    limit: int,
+) -> tuple[list[SearchResults], int]:
+    """
+    Browse books on HebrewBooks.org
+
+    Args:
+        browse_type: The type of search
+        browse_id: The ID of the search
+        offset: The offset to start from
+        limit: The number of results to return
+    Returns:
+        tuple[list[SearchResults], int]: The search results and the total number of results
+    """
+    if browse_type not in (BrowseType.LETTER, BrowseType.DATERANGE, BrowseType.SUBJECT):
+        raise ValueError(f"Cannot browse by {browse_type}")
+    return await _get_window(
+        lambda start: _browse_block(browse_type, browse_id, start), offset, limit
+    )
+
+
+@cached("suggestions")
+async def _fetch_suggestions(query: str, search_type: str, limit: int) -> list[str]:
+    """Get suggestions from upstream (see ``get_suggestions``)"""
+    return await _make_request(
+        endpoint="/suggest/suggest.ashx",
+        params={
+            "json": 1,
+            "autosuggest": 1,
+            "limit": limit,
+            "src": search_type,
+            "q": query,
+        },
+        convert_to=None,
+    )
+
+
+async def get_suggestions(query: str, search_type: str, limit: int) -> list[str]:
+    """
+    Get suggestions for a search on HebrewBooks.org
+
+    Refinements of a query whose suggestions were all returned already are answered locally (see
+    ``data.suggestions``), so it's cheap enough to call on every keystroke.
+
+    Args:
+        query: The query to search for
+        search_type: The type of search
+        limit: The number of results to return
+    Returns:
+        list[str]: The search results
+    """
+    if search_type not in ("title", "auth", "ocr"):
+        raise ValueError("Invalid type")
+    trie = suggestions.tries[search_type]
+    if (found := trie.find(query, limit)) is not None:
+        return found
+    results = await _fetch_suggestions(query, search_type, limit)
+    trie.add(query, results, complete=len(results) < limit)
+    return results
+
+
+async def scrape_masechtot() -> list[MasechetBase]:
+    """Scrape the masechtot from shas.aspx (see ``get_masechtot``)"""
+    html = await _make_request(endpoint="/shas.aspx", convert_to="html")
+    return [
+        MasechetBase(id=int(m["value"]), name=m.text)
+        for m in _parse("shas.aspx", html, scrape.MASECHTOT)
+        .find("select", {"id": "cpMstr_ddlMesechtas"})
+        .find_all("option")
+    ]
+
+
+@cached("masechtot")
+async def get_masechtot() -> list[MasechetBase]:
+    """
+    Get all masechtot from HebrewBooks.org
+
+    The id of the masechet is not the hebrewbooks id, but the index in the masechtot list + 1,
+    so you can use it to get the masechet from `get_masechet()`
+
+    The masechtot are read from the Shas catalog (see ``data.shas_catalog``), or scraped if there is no catalog.
+    """
+    if (catalog := shas_catalog.catalog_file.get()) is not None:
+        shas_catalog.catalog_file.refresh_if_old(catalog)
+        return [MasechetBase(id=m.read_id, name=m.name) for m in catalog.masechtot]
+    return await scrape_masechtot()
+
+
+async def scrape_masechet(
+    masehet_read_id: int, masechet: MasechetBase | None = None
+) -> Masechet:
+    """
+    Scrape a masechet from shas.aspx (see ``get_masechet``)
+
+    Args:
+        masehet_read_id: The masechet to scrape
+        masechet: The masechet in the masechtot list (default: looked up in ``get_masechtot``)
+    """
+    if masechet is None:
+        try:
+            masechet = (await get_masechtot())[masehet_read_id - 1]
+        except IndexError:
+            raise ValueError(f"Invalid masechet id: {masehet_read_id}")
+    html = await _make_request(
+        endpoint="/shas.aspx", params={"mesechta": masechet.id}, convert_to="html"
+    )
+    soup = _parse("shas.aspx", html, scrape.MASECHET)
+    masechet_id = int(soup.find("div", {"id": "shaspngcont"}).get("rel").split("_")[0])
+    pages = soup.find("select", {"id": "cpMstr_ddlDafim"}).find_all("option")
+    return Masechet(
+        id=masechet_id,
+        read_id=masehet_read_id,
+        name=masechet.name,
+        page_read_ids=tuple(p["value"] for p in pages),
+        page_names=tuple(p.text for p in pages),
+    )
+
+
+@cached("masechet")
+async def get_masechet(masehet_read_id: int) -> Masechet:
+    """
+    Get a masechet from HebrewBooks.org
+
+    The masechet is read from the Shas catalog (see ``data.shas_catalog``), or scraped if there is no catalog.
+
+    Args:
+        masehet_read_id: The masechet to get
+    """
+    if (catalog := shas_catalog.catalog_file.get()) is None:
+        return await scrape_masechet(masehet_read_id)
+    if not 1 <= masehet_read_id <= len(catalog.masechtot):
+        raise ValueError(f"Invalid masechet id: {masehet_read_id}")
+    masechet = catalog.masechtot[masehet_read_id - 1]
+    return Masechet(
+        id=masechet.id,
+        read_id=masechet.read_id,
+        name=masechet.name,
+        page_read_ids=tuple(masechet.page_read_ids),
+        page_names=tuple(masechet.page_names),
+    )
+
+
+@cached("page")
+async def get_page(page: MasechetPage) -> MasechetPage:
+    """
+    Get a masechet page from HebrewBooks.org
+
+    Args:
+        page: The page to get
+    """
+    html = await _make_request(
+        endpoint="/shas.aspx",
+        params={"mesechta": page.masechet_id, "daf": page.id, "format": "text"},
+        convert_to="html",
+    )
+    soup = _parse("shas.aspx", html, scrape.PAGE_TEXT)
+    return MasechetPage(
+        read_id=page.read_id,
+        masechet_id=page.masechet_id,
+        masechet_read_id=page.masechet_read_id,
+        name=page.name,
+        content=PageContent(
+            gmara=helpers.get_sections(
+                soup=soup,
+                soup_func=lambda sp: sp.find("div", class_="shastext2").find_all(
+                    "span"
+                ),
+                title_funcs=(lambda spn: spn.text,),
+                content_funcs=(
+                    lambda spn: spn.next_sibling if spn.next_sibling else "",
+                ),
+            ),
+            rashi=helpers.get_sections(
+                soup=soup,
+                soup_func=lambda sp: sp.find("div", class_="shastext3").find_all(
+                    "span", class_="five"
+                ),
+                title_funcs=(lambda spn: spn.text,),
+                content_funcs=(
+                    lambda spn: str(spn.next_sibling if spn.next_sibling else ""),
+                ),
+            )
+            if soup.find("div", class_="shastext3")
+            else None,
+            tosfot=helpers.get_sections(
+                soup=soup,
+                soup_func=lambda sp: sp.find("div", class_="shastext4").find_all("div"),
+                title_funcs=(
+                    lambda spn: spn.find("span", class_="shastitle7").text,
+                    lambda spn: spn.find("span", class_="five").text,
+                ),
+                content_funcs=(
+                    lambda spn: str(spn.find("span", class_="five").next_sibling),
+                ),
+            )
+            if soup.find("div", class_="shastext4")
+            else None,
+        ),
+    )
+
+
+async def scrape_tursa(tursa_id: str | None = None) -> list[Tursa]:
+    """Crawl a tursa from HebrewBooks.org (see ``get_tursa``)"""
+    if tursa_id is None:
+        html = await _make_request(endpoint="/tursa", convert_to="html")
+        return [
+            Tursa(id=li["id"], name=li.text.strip(), has_children=True)
+            for li in _parse("tursa", html, scrape.TURSA_MENU)
+            .find("div", {"id": "menu0"})
+            .find_all("li")
+        ]
+    results: list[dict] = await _make_request(
+        endpoint="/generic.aspx", params={"tursa": tursa_id}
+    )
+    return [
+        Tursa(
+            id=i["id"],
+            name=f"{i['text']} ({i['prefix']})" if i["prefix"] else i["text"],
+            has_children=i["prefix"] != "",
+        )
+        for i in results
+    ]
+
+
+@cached("tursa")
+async def get_tursa(tursa_id: str | None = None) -> list[Tursa]:
+    """
+    Get a tursa from HebrewBooks.org
+
+    The tursa is read from the tursa index (see ``data.tursa_index``), or crawled if there is no index.
+    """
+    if (index := tursa_index.index_file.get()) is not None:
+        tursa_index.index_file.refresh_if_old(index)
+        if (children := index.children.get(tursa_id)) is not None:
+            return children
+    return await scrape_tursa(tursa_id)
+
+
+async def get_tursa_node(
+    tursa_id: str, parent_id: str, grandparent_id: str | None = None
+) -> tuple[Tursa, Tursa]:
+    """
+    Get a tursa and its parent
+
+    They're resolved from the tursa index, or looked up in the lists of their parents if there is no index (or
+    it doesn't have them).
+
+    Args:
+        tursa_id: The tursa to get
+        parent_id: The id of its parent
+        grandparent_id: The id of the parent of its parent (None or empty for the roots)
+    """
+    if (index := tursa_index.index_file.get()) is not None and tursa_id in index.nodes:
+        return index.nodes[tursa_id], index.get_parent(tursa_id)
+    tursa = next(t for t in await get_tursa(parent_id) if t.id == tursa_id)
+    parent = next(
+        t for t in await get_tursa(grandparent_id or None) if t.id == parent_id
+    )
+    return tursa, parent
+
+
+async def warm_asset(url: str) -> int:
+    """
+    Download a page asset (PNG or PDF) and drop it, so it's rendered and cached upstream by the time it's requested
+    for real (see ``data.prefetch``)
+
+    Args:
+        url: The url of the asset (e.g. ``book.get_page_pdf(2)``)
+
+    Returns:
+        The number of bytes downloaded
+    """
+    size = 0
+    async with _get_client().stream(
+        "GET", url, timeout=WARM_TIMEOUT, follow_redirects=True
+    ) as res:
+        res.raise_for_status()
+        async for chunk in res.aiter_bytes():
+            size += len(chunk)
+    return size
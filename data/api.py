@@ -1,9 +1,6 @@
-import json
-import requests
-from typing import Literal
-from functools import lru_cache
+from typing import Literal, Iterable
+from data import aioapi, api_cache, metrics, prefetch, resilience, suggestions
 from data.enums import BrowseType
-from .config import get_settings
 from data.models import (
     Letter,
     DateRange,
@@ -13,81 +10,34 @@ from data.models import (
     MasechetBase,
     Masechet,
     MasechetPage,
-    PageContent,
     Tursa,
 )
-from data import helpers
-from bs4 import BeautifulSoup
 
-BASE_API = "https://beta.hebrewbooks.org"
-conf = get_settings()
-api_key = {"api_key": conf.hb_api_key}
-session = requests.Session()
-session.headers.update({"User-Agent": "HebrewBooksBot/1.0"})
+"""
+Blocking HebrewBooks.org API.
 
+Every function here is a thin wrapper around its coroutine in ``data.aioapi``, so the sync handlers and the async ones
+share the same connection pool and caches. Handlers can migrate to ``data.aioapi`` one at a time.
+"""
 
-def _make_request(
-    endpoint: str,
-    params: dict[str, str | int] | None = None,
-    convert_to: str | None = None,
-) -> dict | list | str:
-    """
-    Make a request to HebrewBooks.org
-
-    Args:
-        endpoint: The endpoint to send the request to (e.g. '/search')
-        params: The parameters to send (e.g. {'searchtype': 'all', 'search': 'אבגדה'})
-        convert_to: The type to convert the response to (either 'dict', 'list' or 'html')
-    """
-    if params is None:
-        params = {}
-    params.update(api_key)
-    res = session.get(f"{BASE_API}{endpoint}", params=params)
-    res.raise_for_status()
-    start, end = ("[", "]") if convert_to == "list" else ("{", "}")
-    return (
-        json.loads(res.text[res.text.index(start) : res.text.rindex(end) + 1])
-        if convert_to not in ("html", None)
-        else res.text
-        if convert_to == "html"
-        else res.json()
-    )
+BASE_API = aioapi.BASE_API
 
 
-@lru_cache
 def get_letters() -> list[Letter]:
     """Get all letters from HebrewBooks.org"""
-    data = _make_request(
-        endpoint="/api/api.ashx",
-        params={"req": "subject_list", "type": "letter", "callback": "bot"},
-        convert_to="list",
-    )
-    return [Letter(**letter) for letter in data]
+    return aioapi.run_sync(aioapi.get_letters())
 
 
-@lru_cache
 def get_date_ranges() -> list[DateRange]:
     """Get all date ranges from HebrewBooks.org"""
-    data = _make_request(
-        endpoint="/api/api.ashx",
-        params={"req": "subject_list", "type": "daterange", "callback": "bot"},
-        convert_to="list",
-    )
-    return [DateRange(**date_range) for date_range in data]
+    return aioapi.run_sync(aioapi.get_date_ranges())
 
 
-@lru_cache
 def get_subjects() -> list[Subject]:
     """Get all subjects from HebrewBooks.org"""
-    data = _make_request(
-        endpoint="/api/api.ashx",
-        params={"req": "subject_list", "type": "subject", "callback": "bot"},
-        convert_to="list",
-    )
-    return [Subject(**subject) for subject in data]
+    return aioapi.run_sync(aioapi.get_subjects())
 
 
-@lru_cache
 def get_book(book_id: int) -> Book | None:
     """
     Get book information from HebrewBooks.org
@@ -98,23 +48,22 @@ def get_book(book_id: int) -> Book | None:
     Returns:
         Book: The book's information
     """
-    try:
-        return Book(
-            **_make_request(
-                endpoint="/api/api.ashx",
-                params={"req": "book_info", "id": book_id, "callback": "bot"},
-                convert_to="dict",
-            )
-        )
-    except requests.HTTPError as e:
-        if e.response.status_code == 400:
-            return None
-        raise
-    except ValueError:
-        return None
+    return aioapi.run_sync(aioapi.get_book(book_id))
+
+
+def get_books(book_ids: Iterable[int]) -> list[Book | None]:
+    """
+    Get the information of many books from HebrewBooks.org at once
+
+    Args:
+        book_ids: The books IDs
+
+    Returns:
+        list[Book | None]: The books, in the same order as ``book_ids``
+    """
+    return aioapi.run_sync(aioapi.get_books(book_ids))
 
 
-@lru_cache(maxsize=10_000)
 def search(
     title: str, author: str, offset: int, limit: int
 ) -> tuple[list[SearchResults], int]:
@@ -129,30 +78,11 @@ def search(
     Returns:
         tuple[list[SearchResults], int]: The search results and the total number of results
     """
-    if not any((title, author)):
-        raise ValueError("You must specify a title or author")
-    try:
-        data = _make_request(
-            endpoint="/api/api.ashx",
-            params={
-                "author_search": author,
-                "title_search": title,
-                "start": offset,
-                "length": limit,
-                "callback": "bot",
-            },
-            convert_to="dict",
-        )
-    except ValueError:
-        return [], 0
-    except requests.HTTPError as e:
-        if e.response.status_code in (400, 500):
-            return [], 0
-        raise
-    return [SearchResults(**b) for b in data["data"]], data["total"]
+    return aioapi.run_sync(
+        aioapi.search(title=title, author=author, offset=offset, limit=limit)
+    )
 
 
-@lru_cache(maxsize=10_000)
 def browse(
     browse_type: Literal[BrowseType.LETTER, BrowseType.DATERANGE, BrowseType.SUBJECT],
     browse_id: int | str,
@@ -170,24 +100,13 @@ def browse(
     Returns:
         tuple[list[SearchResults], int]: The search results and the total number of results
     """
-    if browse_type not in (BrowseType.LETTER, BrowseType.DATERANGE, BrowseType.SUBJECT):
-        raise ValueError(f"Cannot browse by {browse_type}")
-    data = _make_request(
-        endpoint="/api/api.ashx",
-        params={
-            "req": "title_list_for_subject",
-            "list_type": browse_type.value,
-            "id": browse_id,
-            "start": offset,
-            "length": limit,
-            "callback": "bot",
-        },
-        convert_to="dict",
+    return aioapi.run_sync(
+        aioapi.browse(
+            browse_type=browse_type, browse_id=browse_id, offset=offset, limit=limit
+        )
     )
-    return [SearchResults(**book) for book in data["data"]], data["total"]
 
 
-@lru_cache(maxsize=10_000)
 def get_suggestions(query: str, search_type: str, limit: int) -> list[str]:
     """
     Get suggestions for a search on HebrewBooks.org
@@ -199,22 +118,11 @@ def get_suggestions(query: str, search_type: str, limit: int) -> list[str]:
     Returns:
         list[str]: The search results
     """
-    if search_type not in ("title", "auth", "ocr"):
-        raise ValueError("Invalid type")
-    return _make_request(
-        endpoint="/suggest/suggest.ashx",
-        params={
-            "json": 1,
-            "autosuggest": 1,
-            "limit": limit,
-            "src": search_type,
-            "q": query,
-        },
-        convert_to=None,
+    return aioapi.run_sync(
+        aioapi.get_suggestions(query=query, search_type=search_type, limit=limit)
     )
 
 
-@lru_cache
 def get_masechtot() -> list[MasechetBase]:
     """
     Get all masechtot from HebrewBooks.org
@@ -222,16 +130,9 @@ def get_masechtot() -> list[MasechetBase]:
     The id of the masechet is not the hebrewbooks id, but the index in the masechtot list + 1,
     so you can use it to get the masechet from `api.get_masechet()`
     """
-    html = _make_request(endpoint="/shas.aspx", convert_to="html")
-    return [
-        MasechetBase(id=int(m["value"]), name=m.text)
-        for m in BeautifulSoup(html, "html.parser")
-        .find("select", {"id": "cpMstr_ddlMesechtas"})
-        .find_all("option")
-    ]
+    return aioapi.run_sync(aioapi.get_masechtot())
 
 
-@lru_cache
 def get_masechet(masehet_read_id: int) -> Masechet:
     """
     Get a masechet from HebrewBooks.org
@@ -239,32 +140,9 @@ def get_masechet(masehet_read_id: int) -> Masechet:
     Args:
         masehet_read_id: The masechet to get
     """
-    try:
-        masechet = get_masechtot()[masehet_read_id - 1]
-    except IndexError:
-        raise ValueError(f"Invalid masechet id: {masehet_read_id}")
-    html = _make_request(
-        endpoint=f"/shas.aspx", params={"mesechta": masechet.id}, convert_to="html"
-    )
-    soup = BeautifulSoup(html, "html.parser")
-    masechet_id = int(soup.find("div", {"id": "shaspngcont"}).get("rel").split("_")[0])
-    return Masechet(
-        id=masechet_id,
-        read_id=masehet_read_id,
-        name=masechet.name,
-        pages=[
-            MasechetPage(
-                read_id=p["value"],
-                masechet_id=masechet_id,
-                masechet_read_id=masehet_read_id,
-                name=p.text,
-            )
-            for p in soup.find("select", {"id": "cpMstr_ddlDafim"}).find_all("option")
-        ],
-    )
+    return aioapi.run_sync(aioapi.get_masechet(masehet_read_id))
 
 
-@lru_cache
 def get_page(page: MasechetPage) -> MasechetPage:
     """
     Get a masechet page from HebrewBooks.org
@@ -272,76 +150,57 @@ def get_page(page: MasechetPage) -> MasechetPage:
     Args:
         page: The page to get
     """
-    html = _make_request(
-        endpoint=f"/shas.aspx",
-        params={"mesechta": page.masechet_id, "daf": page.id, "format": "text"},
-        convert_to="html",
-    )
-    soup = BeautifulSoup(html, "html.parser")
-    return MasechetPage(
-        read_id=page.read_id,
-        masechet_id=page.masechet_id,
-        name=page.name,
-        content=PageContent(
-            gmara=helpers.get_sections(
-                soup=soup,
-                soup_func=lambda sp: sp.find("div", class_="shastext2").find_all(
-                    "span"
-                ),
-                title_funcs=(lambda spn: spn.text,),
-                content_funcs=(
-                    lambda spn: spn.next_sibling if spn.next_sibling else "",
-                ),
-            ),
-            rashi=helpers.get_sections(
-                soup=soup,
-                soup_func=lambda sp: sp.find("div", class_="shastext3").find_all(
-                    "span", class_="five"
-                ),
-                title_funcs=(lambda spn: spn.text,),
-                content_funcs=(
-                    lambda spn: str(spn.next_sibling if spn.next_sibling else ""),
-                ),
-            )
-            if soup.find("div", class_="shastext3")
-            else None,
-            tosfot=helpers.get_sections(
-                soup=soup,
-                soup_func=lambda sp: sp.find("div", class_="shastext4").find_all("div"),
-                title_funcs=(
-                    lambda spn: spn.find("span", class_="shastitle7").text,
-                    lambda spn: spn.find("span", class_="five").text,
-                ),
-                content_funcs=(
-                    lambda spn: str(spn.find("span", class_="five").next_sibling),
-                ),
-            )
-            if soup.find("div", class_="shastext4")
-            else None,
-        ),
-    )
+    return aioapi.run_sync(aioapi.get_page(page))
 
 
-@lru_cache
 def get_tursa(tursa_id: str | None = None) -> list[Tursa]:
     """Get a tursa from HebrewBooks.org"""
-    if tursa_id is None:
-        html = _make_request(endpoint="/tursa", convert_to="html")
-        return [
-            Tursa(id=li["id"], name=li.text.strip(), has_children=True)
-            for li in BeautifulSoup(html, "html.parser")
-            .find("div", {"id": "menu0"})
-            .find_all("li")
-        ]
-    results: list[dict] = _make_request(endpoint=f"/generic.aspx?tursa={tursa_id}")
-    return [
-        Tursa(
-            id=i["id"],
-            name=f"{i['text']} ({i['prefix']})" if i["prefix"] else i["text"],
-            has_children=i["prefix"] != "",
+    return aioapi.run_sync(aioapi.get_tursa(tursa_id))
+
+
+def get_tursa_node(
+    tursa_id: str, parent_id: str, grandparent_id: str | None = None
+) -> tuple[Tursa, Tursa]:
+    """
+    Get a tursa and its parent
+
+    Args:
+        tursa_id: The tursa to get
+        parent_id: The id of its parent
+        grandparent_id: The id of the parent of its parent (None for the roots)
+    """
+    return aioapi.run_sync(
+        aioapi.get_tursa_node(
+            tursa_id=tursa_id, parent_id=parent_id, grandparent_id=grandparent_id
         )
-        for i in results
-    ]
+    )
+
+
+def get_cache_stats() -> dict[str, dict]:
+    """Get the occupancy, limits and hit/miss counters of every API cache, the suggestion tries and the prefetch"""
+    return {
+        **api_cache.get_stats(),
+        **{f"suggestions_{src}": s for src, s in suggestions.get_stats().items()},
+        "prefetch": prefetch.get_stats(),
+    }
+
+
+def get_upstream_stats() -> dict[str, dict]:
+    """Get the state of the upstream circuit breakers, the retry budget and the in-flight requests"""
+    return {
+        **resilience.get_stats(),
+        "requests": aioapi.requests_flight.get_stats(),
+    }
+
+
+def get_metrics() -> dict[str, dict]:
+    """Get the upstream metrics (latency histograms, sizes, statuses and disk cache outcomes) of every endpoint"""
+    return metrics.snapshot()
+
+
+def get_metrics_summary() -> dict[str, dict]:
+    """Get the latency percentiles (p50/p99/max), sizes, statuses and disk cache outcomes of every endpoint, as texts"""
+    return metrics.summary()
 
 
 if __name__ == "__main__":
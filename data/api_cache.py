@@ -0,0 +1,332 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace, asdict
+from functools import wraps
+from typing import Any, Callable, Hashable
+from data import resilience
+from data.enums import BaseEnum
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+"""
+**Cache policies for the HebrewBooks API.**
+
+Every cached function in ``data.aioapi`` is decorated with ``@cached(name)``, and ``name`` is looked up in
+``POLICIES``: how many entries (and bytes) to keep, how long they are fresh, how long to keep negative results
+(``None`` / empty results) and what to do when they expire. The policies can be tuned from the settings, e.g.:
+
+    HB_CACHE_POLICIES='{"search": {"max_entries": 5000, "ttl": 600}}'
+"""
+
+
+class Refresh(BaseEnum):
+    # Expired entries are dropped, the next call waits for upstream
+    EXPIRE = "expire"
+    # Like EXPIRE, but if upstream fails the expired entry is served
+    KEEP_STALE = "keep_stale"
+    # Expired entries are served right away, while a background task refreshes them (stale-while-revalidate)
+    BACKGROUND = "background"
+
+
+@dataclass(frozen=True, slots=True)
+class CachePolicy:
+    """
+    How a cache behaves
+
+    - max_entries: The maximum number of entries, None for unbounded
+    - max_bytes: The maximum (estimated) size of the cached values, None for unbounded
+    - ttl: The number of seconds an entry is fresh, None to never expire
+    - negative_ttl: The number of seconds to keep None / empty results, None to use ``ttl``
+    - refresh: What to do with expired entries
+    """
+
+    max_entries: int | None = None
+    max_bytes: int | None = None
+    ttl: float | None = None
+    negative_ttl: float | None = None
+    refresh: Refresh = Refresh.EXPIRE
+
+
+MINUTE, HOUR, DAY, MB = 60, 60 * 60, 24 * 60 * 60, 2**20
+
+POLICIES: dict[str, CachePolicy] = {
+    "letters": CachePolicy(max_entries=1, ttl=HOUR, refresh=Refresh.BACKGROUND),
+    "date_ranges": CachePolicy(max_entries=1, ttl=HOUR, refresh=Refresh.BACKGROUND),
+    "subjects": CachePolicy(max_entries=1, ttl=HOUR, refresh=Refresh.BACKGROUND),
+    "book": CachePolicy(
+        max_entries=50_000, max_bytes=32 * MB, ttl=7 * DAY, negative_ttl=HOUR
+    ),
+    "search": CachePolicy(
+        max_entries=10_000, max_bytes=64 * MB, ttl=HOUR, negative_ttl=10 * MINUTE
+    ),
+    "browse": CachePolicy(
+        max_entries=10_000, max_bytes=64 * MB, ttl=DAY, negative_ttl=HOUR
+    ),
+    "suggestions": CachePolicy(
+        max_entries=10_000, max_bytes=16 * MB, ttl=DAY, negative_ttl=HOUR
+    ),
+    # The body checks the age of the Shas catalog, so it runs once a day
+    "masechtot": CachePolicy(max_entries=1, ttl=DAY, refresh=Refresh.KEEP_STALE),
+    "masechet": CachePolicy(max_entries=100, ttl=7 * DAY, refresh=Refresh.KEEP_STALE),
+    "page": CachePolicy(max_entries=2_000, max_bytes=64 * MB, ttl=30 * DAY),
+    "tursa": CachePolicy(max_entries=5_000, ttl=7 * DAY, refresh=Refresh.KEEP_STALE),
+    # Parsed upstream responses by the hash of their body (see data.aioapi._send_request)
+    "parsed": CachePolicy(max_entries=2_000, ttl=HOUR),
+    # The page assets warmed by data.prefetch (url -> True), so they aren't warmed again
+    "prefetch": CachePolicy(max_entries=20_000, ttl=HOUR),
+    # The ready-to-send inline answers of tg.search (query, offset, language -> answer)
+    "inline_answers": CachePolicy(
+        max_entries=5_000, max_bytes=32 * MB, ttl=10 * MINUTE
+    ),
+}
+
+
+def get_policy(name: str) -> CachePolicy:
+    """Get the policy of a cache, with the overrides from the settings"""
+    overrides = dict(get_settings().hb_cache_policies.get(name, {}))
+    if "refresh" in overrides:
+        overrides["refresh"] = Refresh(overrides["refresh"])
+    return replace(POLICIES.get(name, CachePolicy()), **overrides)
+
+
+def _sizeof(obj: Any) -> int:
+    """Estimate the memory size of an object (including the objects it holds)"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return size + sum(_sizeof(k) + _sizeof(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(_sizeof(i) for i in obj)
+    if hasattr(obj, "__slots__") and not isinstance(obj, (str, bytes, int, float)):
+        return size + sum(_sizeof(getattr(obj, s, None)) for s in obj.__slots__)
+    return size
+
+
+def _is_negative(value: Any) -> bool:
+    """None, empty results and empty (results, total) tuples"""
+    return (
+        value is None
+        or (isinstance(value, (list, dict)) and not value)
+        or (isinstance(value, tuple) and len(value) == 2 and not value[0])
+    )
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    LRU cache with TTLs and a size cap, enforcing a ``CachePolicy``
+        - Safe to use from many threads and event loops
+    """
+
+    def __init__(self, policy: CachePolicy):
+        self.policy = policy
+        self._lock = threading.Lock()
+        # key -> (value, expires_at, size)
+        self._data: OrderedDict[Hashable, tuple[Any, float | None, int]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, stale: bool = False, default: Any = None) -> Any:
+        """
+        Get a cached value
+
+        :param key: The key of the value
+        :param stale: Return the value even if it's expired
+        :param default: What to return if the value is missing or expired
+        :return: The value, or ``default``
+        """
+        with self._lock:
+            try:
+                value, expires_at, _ = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if not stale and expires_at is not None and expires_at <= time.monotonic():
+                if self.policy.refresh is Refresh.EXPIRE:
+                    self._pop(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def lookup(self, key: Hashable, default: Any = None) -> tuple[Any, bool]:
+        """
+        Get a cached value, even if it's expired, and whether it's still fresh
+
+        :param key: The key of the value
+        :param default: What to return if the value is missing
+        :return: The value (or ``default``) and whether it's fresh
+        """
+        with self._lock:
+            try:
+                value, expires_at, _ = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default, False
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value, expires_at is None or expires_at > time.monotonic()
+
+    def set(self, key: Hashable, value: Any):
+        """
+        Cache a value, and evict the least recently used values if the cache is full
+
+        :param key: The key of the value
+        :param value: The value to cache
+        """
+        ttl = (
+            self.policy.negative_ttl
+            if self.policy.negative_ttl is not None and _is_negative(value)
+            else self.policy.ttl
+        )
+        size = _sizeof(value) if self.policy.max_bytes is not None else 0
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (
+                value,
+                time.monotonic() + ttl if ttl is not None else None,
+                size,
+            )
+            self._bytes += size
+            while self._data and (
+                (
+                    self.policy.max_entries is not None
+                    and len(self._data) > self.policy.max_entries
+                )
+                or (
+                    self.policy.max_bytes is not None
+                    and self._bytes > self.policy.max_bytes
+                )
+            ):
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key: Hashable):
+        """
+        Delete a cached value
+
+        :param key: The key of the value
+        """
+        with self._lock:
+            self._pop(key)
+
+    def _pop(self, key: Hashable):
+        if (entry := self._data.pop(key, None)) is not None:
+            self._bytes -= entry[2]
+
+    def clear(self):
+        """Delete all the cached values"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> dict[str, Any]:
+        """Return the occupancy of the cache, its limits and its hit/miss counters"""
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            **asdict(self.policy),
+        }
+
+
+caches: dict[str, TTLCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name: str) -> TTLCache:
+    """
+    Get the named cache, created with the ``name`` policy on first use (its stats are reported with the others)
+
+    Usage:
+        >>> inline_answers = get_cache("inline_answers")
+
+    :param name: The name of the cache and of its policy in ``POLICIES``
+    """
+    with _caches_lock:
+        if (cache := caches.get(name)) is None:
+            cache = caches[name] = TTLCache(get_policy(name))
+        return cache
+
+
+def cached(name: str) -> Callable:
+    """
+    Cache the results of a coroutine function by its arguments, according to the ``name`` policy
+
+    Usage:
+        >>> @cached("book")
+        >>> async def get_book(book_id: int) -> Book | None:
+        >>>     ...
+
+    :param name: The name of the cache and of its policy in ``POLICIES``
+    """
+
+    def decorator(func):
+        cache = get_cache(name)
+        policy = cache.policy
+
+        refreshing: set[Hashable] = set()
+        refreshing_lock = threading.Lock()
+        # Strong references to the refresh tasks, so they aren't garbage collected mid-way
+        tasks: set[asyncio.Task] = set()
+
+        async def refresh(key: Hashable, args: tuple, kwargs: dict):
+            try:
+                # Swapped in atomically, the callers get either the old value or the new one
+                cache.set(key, await func(*args, **kwargs))
+            except Exception as e:
+                logger.warning(
+                    f"{name}: background refresh failed, serving a stale value: "
+                    f"{resilience.describe(e)}"
+                )
+            finally:
+                with refreshing_lock:
+                    refreshing.discard(key)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (args, tuple(kwargs.items()))
+            if policy.refresh is Refresh.BACKGROUND:
+                value, fresh = cache.lookup(key, default=_MISSING)
+                if value is not _MISSING:
+                    if not fresh:
+                        with refreshing_lock:
+                            if key in refreshing:
+                                return value
+                            refreshing.add(key)
+                        task = asyncio.create_task(refresh(key, args, kwargs))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                    return value
+            elif (value := cache.get(key, default=_MISSING)) is not _MISSING:
+                return value
+            try:
+                value = await func(*args, **kwargs)
+            except Exception:
+                if policy.refresh is Refresh.KEEP_STALE and (
+                    (stale := cache.get(key, stale=True, default=_MISSING))
+                    is not _MISSING
+                ):
+                    logger.warning(f"{name}: upstream failed, serving a stale value")
+                    return stale
+                raise
+            cache.set(key, value)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def get_stats() -> dict[str, dict[str, Any]]:
+    """Return the stats of every cache, by name"""
+    return {name: cache.get_stats() for name, cache in caches.items()}
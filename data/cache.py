@@ -1,6 +1,14 @@
+import asyncio
+import inspect
 import logging
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
 from typing import Any, Optional, Tuple, Dict, Hashable, Iterable, Callable, Union
+from data.config import get_settings
+from data.shared_cache import SharedCache
+from data.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +25,11 @@ objects being flooded in memory. Apart from that, `lru_cache` lacks such basic f
 3: the flexibility in choosing the name of the cache
 4: the ability to delete a specific item from the cache
 5: run the function anyway and still store the cache
+6: a max-entries cap (LRU eviction) and an optional TTL per cache name, so the memory stays flat
+7: negative caching: None results can be cached too, for a shorter TTL
+8: safe to use from many threads, and concurrent misses of the same key wait for one call of the function
+9: an optional second level shared by the processes on the host, with invalidations that take effect in all of them
+10: coroutine functions are supported too: their results are awaited and cached, and concurrent awaits are collapsed
 
 (In the future, maybe I'll add more features for `lru_cache` and more)
 
@@ -24,15 +37,108 @@ You will find all these, and more, in the realization before you:
 """
 
 
+_MISSING = object()
+# Stored instead of a None result (a None data is a miss for ``get``)
+_NEGATIVE = object()
+
+
+class _Namespace:
+    """The entries of a cache name, from the least to the most recently used, and its limits"""
+
+    __slots__ = ("entries", "max_entries", "ttl", "negative_ttl", "lock", "version")
+
+    def __init__(
+        self,
+        max_entries: Optional[int],
+        ttl: Optional[float],
+        negative_ttl: Optional[float] = None,
+    ):
+        # cache id -> (data, expires at)
+        self.entries: OrderedDict[Hashable, Tuple[Any, Optional[float]]] = OrderedDict()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # None results are cached only if it's set
+        self.negative_ttl = negative_ttl
+        # A lock per cache name, so the cache names don't contend with each other
+        self.lock = threading.Lock()
+        # Increased on every delete, so a call that started before it doesn't cache its (stale) result
+        self.version = 0
+
+
 class MemoryCache:
     """
     Memory cache
         - This cache is not persistent, it will be lost when the application is restarted or the server is restarted
+        - Every cache name keeps up to ``max_entries`` entries (the least recently used are evicted) for ``ttl`` seconds
+        - Safe to use from many threads (every cache name has its own lock)
+        - With a ``shared`` cache, the misses are looked up in it and the deletes are broadcast to the other processes
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        max_entries: Optional[int] = 10_000,
+        ttl: Optional[float] = None,
+        shared: Optional[Any] = None,
+        poll_interval: float = 1.0,
+    ):
+        """
+        :param max_entries: The default max entries of a cache name, None for unbounded
+        :param ttl: The default number of seconds to keep an entry, None to keep it until it's evicted
+        :param shared: A second-level cache shared by the processes (e.g. ``data.shared_cache.SharedCache``), with
+            ``get``, ``set``, ``invalidate`` and ``poll`` methods
+        :param poll_interval: The number of seconds between polls of the shared cache invalidations
+        """
         logger.debug("memory cache initialized")
-        self._cache = {}
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self.poll_interval = poll_interval
+        self._polled_at = 0.0
+        self._poll_lock = threading.Lock()
+        self._cache: Dict[Hashable, _Namespace] = {}
+        self._lock = threading.Lock()  # Guards the creation of the cache names
+        self._flight = SingleFlight()
+
+    def configure(
+        self,
+        cache_name: Hashable,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        negative_ttl: Optional[float] = None,
+    ):
+        """
+        Set the limits of a cache name (the cached data is kept, and evicted if it's over the new cap)
+
+        :param cache_name: The cache name
+        :param max_entries: The max entries of the cache name, None to use the default
+        :param ttl: The number of seconds to keep an entry, None to use the default
+        :param negative_ttl: The number of seconds to keep a None result, None to not cache None results
+        """
+        namespace = self._get_namespace(cache_name)
+        with namespace.lock:
+            namespace.max_entries = (
+                max_entries if max_entries is not None else self.max_entries
+            )
+            namespace.ttl = ttl if ttl is not None else self.ttl
+            namespace.negative_ttl = negative_ttl
+            self._evict(namespace)
+
+    def _get_namespace(self, cache_name: Hashable) -> _Namespace:
+        if (namespace := self._cache.get(cache_name)) is None:
+            with self._lock:
+                if (namespace := self._cache.get(cache_name)) is None:
+                    namespace = self._cache[cache_name] = _Namespace(
+                        max_entries=self.max_entries, ttl=self.ttl
+                    )
+        return namespace
+
+    @staticmethod
+    def _evict(namespace: _Namespace):
+        """Evict the least recently used entries of a cache name, until it fits in its cap (under its lock)"""
+        if namespace.max_entries is None:
+            return
+        while len(namespace.entries) > namespace.max_entries:
+            namespace.entries.popitem(last=False)
 
     @staticmethod
     def build_cache_id(*args, **kwargs) -> Tuple[Tuple[Any, ...], ...]:
@@ -56,11 +162,40 @@ class MemoryCache:
             *args if params is not None else (), **_kwargs
         )
 
+    def _begin_load(self, cache_name: Hashable, cache_id: Hashable) -> Tuple[Any, int]:
+        """
+        Start loading data after a miss
+
+        :return: The cached data if a call that finished while this one was joining the flight loaded it (else
+            ``_MISSING``), and the version of the cache name before the load
+        """
+        if (
+            cache_data := self._lookup(cache_name=cache_name, cache_id=cache_id)
+        ) is not _MISSING:
+            return cache_data, 0
+        return _MISSING, self._get_namespace(cache_name).version
+
+    def _end_load(
+        self, cache_name: Hashable, cache_id: Hashable, version: int, cache_data: Any
+    ):
+        """Cache loaded data, unless its cache name was invalidated during the load (here or by another process)"""
+        self._poll(force=True)
+        namespace = self._get_namespace(cache_name)
+        with namespace.lock:
+            if namespace.version != version:
+                return
+            ttl = self._store(namespace, cache_id, cache_data)
+        if self.shared is not None and ttl is not _MISSING:
+            self.shared.set(cache_name, cache_id, cache_data, ttl=ttl)
+
     def cachable(
         self,
         cache_name: Optional[Hashable] = None,
         params: Optional[Union[Iterable[str], str]] = None,
         always_execute: bool = False,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        negative_ttl: Optional[float] = None,
     ) -> Callable:
         """
         Cache decorator
@@ -74,30 +209,87 @@ class MemoryCache:
             3
             >>> plus(a=1, b=2)  # The result will be retrieved from the cache
             3
+            >>> @cache.cachable(cache_name='users', params='user_id')
+            >>> async def get_user(*, user_id):  # Coroutine functions are awaited, and their results are cached
+            >>>     ...
 
         :param cache_name: The cache name to use, must be a hashable object. If None, the function name will be used
         :param params: The parameters to use as cache id, if None, all parameters will be used (*args, **kwargs)
         :param always_execute: If True, the function will be executed even if the cache is valid. The result will be cached
+        :param max_entries: The max entries of the cache name (the least recently used are evicted), None for the default
+        :param ttl: The number of seconds to keep an entry, None for the default
+        :param negative_ttl: The number of seconds to keep a None result (e.g. a missing user), if None - None results
+            are not cached and the function is executed again on the next call
         """
 
         def decorator(func):
+            nonlocal cache_name
+            if cache_name is None:
+                cache_name = func.__name__
+            if any(v is not None for v in (max_entries, ttl, negative_ttl)):
+                self.configure(
+                    cache_name=cache_name,
+                    max_entries=max_entries,
+                    ttl=ttl,
+                    negative_ttl=negative_ttl,
+                )
+
+            def load(cache_id: Hashable, args: tuple, kwargs: dict) -> Any:
+                cache_data, version = self._begin_load(cache_name, cache_id)
+                if cache_data is _MISSING:
+                    cache_data = func(*args, **kwargs)
+                    self._end_load(cache_name, cache_id, version, cache_data)
+                return cache_data
+
+            async def aload(cache_id: Hashable, args: tuple, kwargs: dict) -> Any:
+                cache_data, version = await self._off_loop(
+                    self._begin_load, cache_name, cache_id
+                )
+                if cache_data is _MISSING:
+                    cache_data = await func(*args, **kwargs)
+                    await self._off_loop(
+                        self._end_load, cache_name, cache_id, version, cache_data
+                    )
+                return cache_data
+
+            if inspect.iscoroutinefunction(func):
+
+                @wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    cache_id = self._get_cache_id(params, *args, **kwargs)
+                    if always_execute:
+                        cache_data = await func(*args, **kwargs)
+                        await self._off_loop(
+                            self.set,
+                            cache_name=cache_name,
+                            cache_id=cache_id,
+                            cache_data=cache_data,
+                        )
+                        return cache_data
+                    cache_data = await self._alookup(cache_name, cache_id)
+                    if cache_data is _MISSING:
+                        # Concurrent misses of the same key (from any thread or loop) await one call
+                        cache_data = await self._flight.ado(
+                            (cache_name, cache_id), aload, cache_id, args, kwargs
+                        )
+                    return cache_data
+
+                return async_wrapper
+
             @wraps(func)
             def wrapper(*args, **kwargs):
-                nonlocal cache_name, params
                 cache_id = self._get_cache_id(params, *args, **kwargs)
-                if cache_name is None:
-                    cache_name = func.__name__
                 if always_execute:
                     cache_data = func(*args, **kwargs)
                     self.set(
                         cache_name=cache_name, cache_id=cache_id, cache_data=cache_data
                     )
                     return cache_data
-                cache_data = self.get(cache_name=cache_name, cache_id=cache_id)
-                if cache_data is None:
-                    cache_data = func(*args, **kwargs)
-                    self.set(
-                        cache_name=cache_name, cache_id=cache_id, cache_data=cache_data
+                cache_data = self._lookup(cache_name=cache_name, cache_id=cache_id)
+                if cache_data is _MISSING:
+                    # Concurrent misses of the same key wait for one call
+                    cache_data = self._flight.do(
+                        (cache_name, cache_id), load, cache_id, args, kwargs
                     )
                 return cache_data
 
@@ -128,6 +320,27 @@ class MemoryCache:
         """
 
         def decorator(func):
+            if inspect.iscoroutinefunction(func):
+
+                @wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    nonlocal cache_name, params
+                    cache_id = self._get_cache_id(params, *args, **kwargs)
+                    if cache_name is None:
+                        cache_name = func.__name__
+                    if before:
+                        await self._off_loop(
+                            self.delete, cache_name=cache_name, cache_id=cache_id
+                        )
+                    result = await func(*args, **kwargs)
+                    if not before:
+                        await self._off_loop(
+                            self.delete, cache_name=cache_name, cache_id=cache_id
+                        )
+                    return result
+
+                return async_wrapper
+
             @wraps(func)
             def wrapper(*args, **kwargs):
                 nonlocal cache_name, params
@@ -151,9 +364,74 @@ class MemoryCache:
 
         :param cache_name: The cache name to get the data from
         :param cache_id: The cache id to get the data from
-        :return: The cached data
+        :return: The cached data, None if it's missing or expired
+        """
+        cache_data = self._lookup(cache_name=cache_name, cache_id=cache_id)
+        return None if cache_data is _MISSING else cache_data
+
+    def _lookup(self, cache_name: Hashable, cache_id: Hashable) -> Any:
+        """Get cached data, ``_MISSING`` if it's missing or expired (a cached None result is returned as None)"""
+        self._poll()
+        if (cache_data := self._lookup_local(cache_name, cache_id)) is not _MISSING:
+            return cache_data
+        if self.shared is None:
+            return _MISSING
+        found, cache_data = self.shared.get(cache_name, cache_id)
+        if not found:
+            return _MISSING
+        namespace = self._get_namespace(cache_name)
+        with namespace.lock:
+            self._store(namespace, cache_id, cache_data)
+        return cache_data
+
+    async def _alookup(self, cache_name: Hashable, cache_id: Hashable) -> Any:
+        """``_lookup`` for coroutines, the memory hits are served on the event loop and the rest in a thread"""
+        if self.shared is not None and not self._poll_due():
+            if (cache_data := self._lookup_local(cache_name, cache_id)) is not _MISSING:
+                return cache_data
+        return await self._off_loop(self._lookup, cache_name, cache_id)
+
+    async def _off_loop(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Call a method that may use the shared cache from a coroutine: in a thread if there is a shared cache, so its
+        SQLite calls (and the lock of a forced poll) don't block the event loop
         """
-        return self._cache.get(cache_name, {}).get(cache_id)
+        if self.shared is None:
+            return func(*args, **kwargs)
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    def _lookup_local(self, cache_name: Hashable, cache_id: Hashable) -> Any:
+        """Get cached data from the memory of this process, ``_MISSING`` if it's missing or expired"""
+        if (namespace := self._cache.get(cache_name)) is None:
+            return _MISSING
+        with namespace.lock:
+            try:
+                cache_data, expires_at = namespace.entries[cache_id]
+            except KeyError:
+                return _MISSING
+            if expires_at is not None and expires_at <= time.monotonic():
+                namespace.entries.pop(cache_id, None)
+                return _MISSING
+            namespace.entries.move_to_end(cache_id)
+        return None if cache_data is _NEGATIVE else cache_data
+
+    def _poll_due(self) -> bool:
+        return time.monotonic() - self._polled_at >= self.poll_interval
+
+    def _poll(self, force: bool = False):
+        """Drop the entries the other processes invalidated (at most once per ``poll_interval``, unless forced)"""
+        if self.shared is None or (not force and not self._poll_due()):
+            return
+        if not self._poll_lock.acquire(blocking=force):
+            return  # Another thread is polling
+        try:
+            self._polled_at = time.monotonic()
+            for cache_name, cache_id in self.shared.poll():
+                self._delete_local(cache_name, cache_id)
+        except Exception as e:
+            logger.warning(f"failed to poll the shared cache invalidations: {e!r}")
+        finally:
+            self._poll_lock.release()
 
     def set(self, cache_name: Hashable, cache_id: Hashable, cache_data: Any):
         """
@@ -161,9 +439,30 @@ class MemoryCache:
 
         :param cache_name: The cache name to set the data to
         :param cache_id: The cache id to set the data to
-        :param cache_data: The data to cache
+        :param cache_data: The data to cache, a None data is cached only if the cache name has a ``negative_ttl``
         """
-        self._cache.setdefault(cache_name, {})[cache_id] = cache_data
+        namespace = self._get_namespace(cache_name)
+        with namespace.lock:
+            ttl = self._store(namespace, cache_id, cache_data)
+        if self.shared is not None and ttl is not _MISSING:
+            self.shared.set(cache_name, cache_id, cache_data, ttl=ttl)
+
+    def _store(self, namespace: _Namespace, cache_id: Hashable, cache_data: Any) -> Any:
+        """Cache data in a cache name (under its lock), return its TTL, or ``_MISSING`` if it's not cached"""
+        if cache_data is None:
+            if namespace.negative_ttl is None:
+                namespace.entries.pop(cache_id, None)
+                return _MISSING
+            cache_data, ttl = _NEGATIVE, namespace.negative_ttl
+        else:
+            ttl = namespace.ttl
+        namespace.entries[cache_id] = (
+            cache_data,
+            time.monotonic() + ttl if ttl is not None else None,
+        )
+        namespace.entries.move_to_end(cache_id)
+        self._evict(namespace)
+        return ttl
 
     def delete(self, cache_name: Hashable, cache_id: Optional[Hashable] = None):
         """
@@ -172,21 +471,47 @@ class MemoryCache:
         :param cache_name: The cache name to delete the data from
         :param cache_id: The cache id to delete the data from, if None, all data from the cache name will be deleted
         """
-        if cache_id:
-            self._cache.get(cache_name, {}).pop(cache_id, None)
-        else:
-            self._cache.pop(cache_name, None)
+        self._delete_local(cache_name, cache_id)
+        if self.shared is not None:
+            self.shared.invalidate(cache_name, cache_id or None)
+
+    def _delete_local(self, cache_name: Hashable, cache_id: Optional[Hashable] = None):
+        """Delete cached data from the memory of this process"""
+        if (namespace := self._cache.get(cache_name)) is None:
+            return
+        with namespace.lock:
+            namespace.version += 1
+            if cache_id:
+                namespace.entries.pop(cache_id, None)
+            else:
+                namespace.entries.clear()
 
     def clear(self):
-        """Clear all cached data"""
-        self._cache = {}
+        """Clear all cached data of this process (the limits of the cache names are kept)"""
+        for namespace in list(self._cache.values()):
+            with namespace.lock:
+                namespace.version += 1
+                namespace.entries.clear()
 
     def get_stats(self) -> Dict[Hashable, int]:
         """Return cache stats, the number of cached data per cache name"""
-        return {
-            cache_name: len([i for i in cache if cache[i] is not None])
-            for cache_name, cache in self._cache.items()
-        }
-
-
-cache = MemoryCache()
+        stats = {}
+        for cache_name, namespace in list(self._cache.items()):
+            with namespace.lock:
+                stats[cache_name] = len(
+                    [
+                        i
+                        for i, (data, _) in namespace.entries.items()
+                        if data is not _NEGATIVE
+                    ]
+                )
+        return stats
+
+
+conf = get_settings()
+cache = MemoryCache(
+    shared=SharedCache(conf.hb_shared_cache_path)
+    if conf.hb_shared_cache_path
+    else None,
+    poll_interval=conf.hb_shared_cache_poll_seconds,
+)
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from functools import lru_cache
+from typing import Any
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -39,6 +40,20 @@ class Settings(BaseSettings):
     hb_pdf_full_limit: Limit
     hb_pdf_page_limit: Limit
     hb_image_page_limit: Limit
+    hb_base_url: str = "https://beta.hebrewbooks.org"  # e.g. a bench.standin server
+    hb_disk_cache_path: str = "hb_cache.sqlite"  # empty to disable the disk cache
+    hb_disk_cache_max_mb: int = 256
+    hb_shared_cache_path: str = ""  # see data/shared_cache.py, empty to disable
+    hb_shared_cache_poll_seconds: float = 1.0
+    hb_shas_catalog_path: str = "shas_catalog.json"  # see data/shas_catalog.py
+    hb_shas_catalog_max_age_days: int = 30
+    hb_tursa_index_path: str = "tursa_index.json"  # see data/tursa_index.py
+    hb_tursa_index_max_age_days: int = 30
+    hb_prefetch_ahead: int = 1  # pages to warm after the one being read
+    hb_prefetch_behind: int = 0  # pages to warm before the one being read
+    hb_prefetch_max_in_flight: int = 8  # 0 to disable prefetching
+    # overrides of data.api_cache.POLICIES
+    hb_cache_policies: dict[str, dict[str, Any]] = {}
 
 
 @lru_cache
@@ -0,0 +1,227 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib is always available
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+"""
+**Persistent, compressed cache on disk.**
+
+The values are bytes (e.g. raw HebrewBooks responses), compressed with zstd (if ``zstandard`` is installed) or zlib,
+and stored in a small SQLite file, so they survive restarts and redeploys. Every entry has its own TTL, and when the
+total size of the values passes ``max_bytes`` the least recently used entries are evicted.
+"""
+
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+# The LRU order only needs to be roughly right, so the access time of a hit is written at most once per interval
+ACCESS_INTERVAL = 60
+
+
+class DiskCache:
+    """
+    SQLite-backed bytes cache
+        - Safe to use from many threads, and from many processes on the same host
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 2**20):
+        """
+        :param path: The path of the SQLite file
+        :param max_bytes: The maximum total size of the (compressed) values
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, codec INTEGER NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL, accessed_at REAL NOT NULL, validators TEXT)"
+        )
+        # Files created before the validators were stored
+        if "validators" not in {
+            row[1] for row in self._conn.execute("PRAGMA table_info(entries)")
+        }:
+            self._conn.execute("ALTER TABLE entries ADD COLUMN validators TEXT")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)"
+        )
+        self._conn.commit()
+        self._size = self._total_size()
+        logger.debug(f"disk cache initialized at {path}")
+
+    def _total_size(self) -> int:
+        return self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+
+    @staticmethod
+    def _compress(value: bytes) -> tuple[bytes, int]:
+        if zstandard is not None:
+            return zstandard.ZstdCompressor().compress(value), CODEC_ZSTD
+        return zlib.compress(value), CODEC_ZLIB
+
+    @staticmethod
+    def _decompress(value: bytes, codec: int) -> bytes:
+        if codec == CODEC_ZSTD:
+            return zstandard.ZstdDecompressor().decompress(value)
+        return zlib.decompress(value)
+
+    def get(self, key: str, stale: bool = False) -> Optional[bytes]:
+        """
+        Get a cached value
+
+        :param key: The key of the value
+        :param stale: Return the value even if it's expired (as long as it wasn't evicted yet)
+        :return: The value, or None if it's missing or expired
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, codec, accessed_at FROM entries WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, float("-inf") if stale else now),
+            ).fetchone()
+            if row is None:
+                return None
+            value, codec, accessed_at = row
+            if now - accessed_at > ACCESS_INTERVAL:
+                self._conn.execute(
+                    "UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+                self._conn.commit()
+        return self._decompress(value, codec)
+
+    def get_validators(self, key: str) -> Optional[Dict[str, str]]:
+        """
+        Get the validators of a value (e.g. its ETag), even if it's expired
+
+        :param key: The key of the value
+        :return: The validators, or None if the value is missing or has none
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT validators FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None and row[0] else None
+
+    def touch(self, key: str, ttl: Optional[float] = None) -> bool:
+        """
+        Renew the TTL of a value (e.g. when upstream says it's not modified)
+
+        :param key: The key of the value
+        :param ttl: The number of seconds to keep the value from now, None to keep it until it's evicted
+        :return: Whether the value exists
+        """
+        now = time.time()
+        with self._lock:
+            touched = self._conn.execute(
+                "UPDATE entries SET expires_at = ?, accessed_at = ? WHERE key = ?",
+                (now + ttl if ttl is not None else None, now, key),
+            ).rowcount
+            self._conn.commit()
+        return touched > 0
+
+    def set(
+        self,
+        key: str,
+        value: bytes,
+        ttl: Optional[float] = None,
+        validators: Optional[Dict[str, str]] = None,
+    ):
+        """
+        Cache a value
+
+        :param key: The key of the value
+        :param value: The value to cache
+        :param ttl: The number of seconds to keep the value, None to keep it until it's evicted
+        :param validators: The HTTP validators of the value (``ETag`` / ``Last-Modified``), to revalidate it
+        """
+        now = time.time()
+        compressed, codec = self._compress(value)
+        with self._lock:
+            replaced = self._conn.execute(
+                "SELECT size FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, codec, size, expires_at, accessed_at, validators) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    compressed,
+                    codec,
+                    len(compressed),
+                    now + ttl if ttl is not None else None,
+                    now,
+                    json.dumps(validators) if validators else None,
+                ),
+            )
+            self._conn.commit()
+            self._size += len(compressed) - (replaced[0] if replaced else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Delete the expired entries, then the least recently used ones until the cache fits in ``max_bytes``"""
+        self._conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        self._size = self._total_size()
+        if self._size > self.max_bytes:
+            # Free a bit more than needed, so the next sets don't evict again right away
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM ("
+                "SELECT key, size, SUM(size) OVER (ORDER BY accessed_at, key) AS freed FROM entries"
+                ") WHERE freed - size < ?)",
+                (self._size - int(self.max_bytes * 0.9),),
+            )
+            self._size = self._total_size()
+        self._conn.commit()
+
+    def delete(self, key: str):
+        """
+        Delete a cached value
+
+        :param key: The key of the value
+        """
+        with self._lock:
+            deleted = self._conn.execute(
+                "SELECT size FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+            self._size -= deleted[0] if deleted else 0
+
+    def delete_prefix(self, prefix: str):
+        """
+        Delete the cached values whose keys start with a prefix
+
+        :param prefix: The prefix of the keys
+        """
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            )
+            self._conn.commit()
+            self._size = self._total_size()
+
+    def clear(self):
+        """Delete all the cached values"""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+            self._size = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return the number of entries and their total size in bytes"""
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {"entries": count, "bytes": self._size, "max_bytes": self.max_bytes}
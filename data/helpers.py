@@ -1,4 +1,4 @@
-from typing import Callable
+from typing import Callable, Any
 from bs4 import BeautifulSoup, ResultSet, PageElement
 from data.models import Section
 
@@ -62,3 +62,24 @@ def get_offset(current_offset: int, total: int, increase: int = 5) -> int:
         offset = total - current_offset
         return 0 if offset < increase else offset
     return current_offset + increase
+
+
+def stats_to_text(title: str, stats: dict[str, dict[str, Any]]) -> str:
+    """
+    Format stats (e.g. ``api.get_cache_stats()``) as a text for the admins.
+
+    Args:
+        title: The title of the text.
+        stats: The stats, by name.
+    Returns:
+        One line per name: "name: key=value, key=value".
+    """
+    return "\n".join(
+        (
+            title,
+            *(
+                f"{name}: {', '.join(f'{k}={v}' for k, v in values.items())}"
+                for name, values in stats.items()
+            ),
+        )
+    )
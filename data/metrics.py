@@ -0,0 +1,189 @@
+import bisect
+import math
+import threading
+from typing import Any
+
+"""
+**Upstream metrics, per logical endpoint.**
+
+Every request ``data.aioapi`` sends records, for its logical endpoint (``book_info``, ``search``,
+``title_list_for_subject``, ``shas.aspx``, ``tursa``, ``suggest``...):
+
+    - network: The time of each upstream attempt, in ms
+    - decode: The time to decode the JSON responses, in ms
+    - parse: The time to parse the scraped html pages, in ms
+    - size: The size of the response bodies, in bytes
+    - statuses: The HTTP status codes (and the names of the transport errors)
+    - disk_cache: The outcome of the disk cache lookup (hit, miss, revalidated or stale). The hits of the in-memory
+      caches in front of it never get here, they're counted in ``data.api_cache``
+
+The histograms have fixed buckets, so recording is a bisect and an increment. ``data.aioapi`` may be awaited from
+any event loop, so the endpoints are created under a lock, but the counters are not locked: an increment lost to a
+race between threads doesn't matter for statistics. ``snapshot()`` returns everything, ``summary()`` a line per
+endpoint.
+"""
+
+MS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1_000, 2_500, 5_000, 10_000, 30_000)
+SIZE_BUCKETS = tuple(2**i for i in range(8, 25, 2))  # 256B ... 16MB
+
+
+class Histogram:
+    """Fixed-bucket histogram, each bucket counts the values up to its bound (the last one is unbounded)"""
+
+    __slots__ = ("bounds", "counts", "count", "sum", "max")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        """
+        Record a value
+
+        :param value: The value to record
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        """
+        Estimate a percentile (the bound of the bucket it falls in)
+
+        :param q: The percentile, between 0 and 1
+        """
+        if not self.count:
+            return 0.0
+        rank, seen = math.ceil(q * self.count), 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return the buckets (by bound), the count, the sum and the max"""
+        return {
+            "buckets": dict(zip((*self.bounds, math.inf), self.counts)),
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "max": round(self.max, 3),
+        }
+
+    def summary(self) -> str:
+        """Return 'p50/p99/max (count)'"""
+        p50, p99, top = (
+            round(v, 1) for v in (self.percentile(0.5), self.percentile(0.99), self.max)
+        )
+        return f"{p50:g}/{p99:g}/{top:g} ({self.count})"
+
+
+class EndpointMetrics:
+    """The metrics of one logical endpoint"""
+
+    __slots__ = ("network", "decode", "parse", "size", "statuses", "disk_cache")
+
+    def __init__(self):
+        self.network = Histogram(MS_BUCKETS)
+        self.decode = Histogram(MS_BUCKETS)
+        self.parse = Histogram(MS_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.statuses: dict[int | str, int] = {}
+        self.disk_cache: dict[str, int] = {}
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return the histograms and the counters"""
+        return {
+            "network_ms": self.network.snapshot(),
+            "decode_ms": self.decode.snapshot(),
+            "parse_ms": self.parse.snapshot(),
+            "size_bytes": self.size.snapshot(),
+            "statuses": dict(self.statuses),
+            "disk_cache": dict(self.disk_cache),
+        }
+
+    def summary(self) -> dict[str, str]:
+        """Return the histograms summaries and the counters as texts"""
+        return {
+            "network_ms": self.network.summary(),
+            "decode_ms": self.decode.summary(),
+            "parse_ms": self.parse.summary(),
+            "size": self.size.summary(),
+            "statuses": " ".join(f"{k}:{v}" for k, v in self.statuses.items()),
+            "disk_cache": " ".join(f"{k}:{v}" for k, v in self.disk_cache.items()),
+        }
+
+
+endpoints: dict[str, EndpointMetrics] = {}
+_lock = threading.Lock()
+
+
+def get(name: str) -> EndpointMetrics:
+    """Get (or create) the metrics of a logical endpoint"""
+    if (metrics := endpoints.get(name)) is None:
+        with _lock:
+            if (metrics := endpoints.get(name)) is None:
+                metrics = endpoints[name] = EndpointMetrics()
+    return metrics
+
+
+def observe_network(name: str, seconds: float, status: int | str, size: int = 0):
+    """
+    Record an upstream attempt
+
+    :param name: The logical endpoint (e.g. 'book_info')
+    :param seconds: How long it took
+    :param status: The HTTP status code, or the name of the error (e.g. 'ConnectTimeout')
+    :param size: The size of the response body
+    """
+    metrics = get(name)
+    metrics.network.observe(seconds * 1000)
+    metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+    if size:
+        metrics.size.observe(size)
+
+
+def observe_decode(name: str, seconds: float):
+    """Record the time to decode a JSON response of a logical endpoint"""
+    get(name).decode.observe(seconds * 1000)
+
+
+def observe_parse(name: str, seconds: float):
+    """Record the time to parse a scraped page of a logical endpoint"""
+    get(name).parse.observe(seconds * 1000)
+
+
+def count_disk_cache(name: str, outcome: str):
+    """
+    Record the outcome of a disk cache lookup
+
+    :param name: The logical endpoint
+    :param outcome: 'hit', 'miss', 'revalidated' or 'stale'
+    """
+    disk_cache = get(name).disk_cache
+    disk_cache[outcome] = disk_cache.get(outcome, 0) + 1
+
+
+def snapshot() -> dict[str, dict[str, Any]]:
+    """Return all the metrics, by endpoint"""
+    with _lock:
+        items = list(endpoints.items())
+    return {name: metrics.snapshot() for name, metrics in items}
+
+
+def summary() -> dict[str, dict[str, str]]:
+    """Return the percentiles (p50/p99/max) and counters of every endpoint, for the admins"""
+    with _lock:
+        items = list(endpoints.items())
+    return {name: metrics.summary() for name, metrics in items}
+
+
+def reset():
+    """Forget all the metrics"""
+    with _lock:
+        endpoints.clear()
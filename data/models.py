@@ -1,7 +1,9 @@
-from dataclasses import dataclass
+from array import array
+from dataclasses import dataclass, field
 from .config import get_settings
 
 api_key = get_settings().hb_api_key
+BASE_URL = get_settings().hb_base_url
 
 
 @dataclass(frozen=True, slots=True)
@@ -51,12 +53,12 @@ class Tursa:
     @property
     def pdf_url(self):
         """Get the page PDF url"""
-        return f"https://beta.hebrewbooks.org/tursa/{self.id}.pdf"
+        return f"{BASE_URL}/tursa/{self.id}.pdf"
 
     @property
     def url(self):
         """Get the read page url"""
-        return f"https://beta.hebrewbooks.org/tursa.aspx?a={self.id}"
+        return f"{BASE_URL}/tursa.aspx?a={self.id}"
 
 
 @dataclass(frozen=True, slots=True)
@@ -72,6 +74,49 @@ class PageContent:
     tosfot: list[Section] | None = None
 
 
+def get_daf_id(read_id: str) -> int:
+    """
+    Get the HebrewBooks page id of a daf
+
+    Args:
+        read_id: The read id of the daf (e.g. '2' or '2b')
+    """
+    if read_id.endswith("b"):
+        num = int(read_id[:-1]) + 1
+        return (num - 2) + (num - 2)
+    else:
+        return (int(read_id) - 2) + (int(read_id) - 1)
+
+
+def _hebrew_numeral(num: int) -> str:
+    """Get the Hebrew numeral of a number below 500 (e.g. 15 -> 'טו')"""
+    letters = "קרשת"[num // 100 - 1] if num >= 100 else ""
+    num %= 100
+    if num in (15, 16):
+        return letters + "ט" + "וז"[num - 15]
+    if num >= 10:
+        letters += "יכלמנסעפצ"[num // 10 - 1]
+    if num % 10:
+        letters += "אבגדהוזחט"[num % 10 - 1]
+    return letters
+
+
+def _normalize_daf(name: str) -> str:
+    """Normalize a daf name for matching (no spaces, quotes or case)"""
+    return "".join(c for c in name.casefold() if c not in " '\"׳״")
+
+
+def _daf_keys(read_id: str, name: str) -> set[str]:
+    """The names a daf can be found by: its name, its read id and its Arabic and Hebrew numerals"""
+    num = int(read_id.rstrip("b"))
+    heb = _hebrew_numeral(num)
+    if read_id.endswith("b"):
+        aliases = (f"{num}:", f"{heb}:", f"{heb}b", f"{heb}עב")
+    else:
+        aliases = (str(num), f"{num}a", f"{num}.", heb, f"{heb}.", f"{heb}עא")
+    return {_normalize_daf(name), read_id, *aliases}
+
+
 @dataclass(frozen=True, slots=True)
 class MasechetPage:
     read_id: str
@@ -83,16 +128,12 @@ class MasechetPage:
     @property
     def id(self):
         """Get the page ID"""
-        if self.read_id.endswith("b"):
-            num = int(self.read_id[:-1]) + 1
-            return (num - 2) + (num - 2)
-        else:
-            return (int(self.read_id) - 2) + (int(self.read_id) - 1)
+        return get_daf_id(self.read_id)
 
     @property
     def pdf_url(self) -> str:
         """Get the page's PDF URL"""
-        return f"https://beta.hebrewbooks.org/pagefeed/hebrewbooks_org_{self.masechet_id}_{self.id}.pdf"
+        return f"{BASE_URL}/pagefeed/hebrewbooks_org_{self.masechet_id}_{self.id}.pdf"
 
     def get_page_img(self, width: int, height: int) -> str:
         """
@@ -102,7 +143,7 @@ class MasechetPage:
             width: The width of the image.
             height: The height of the image.
         """
-        return f"https://beta.hebrewbooks.org/reader/pagepngs/{self.masechet_id}_{self.id}_{width}_{height}.png"
+        return f"{BASE_URL}/reader/pagepngs/{self.masechet_id}_{self.id}_{width}_{height}.png"
 
     def get_page_url(self, fmt: str = "pdf") -> str:
         """
@@ -129,15 +170,107 @@ class MasechetBase:
 
 @dataclass(frozen=True, slots=True)
 class Masechet:
+    """
+    A masechet and its dafim, as a compact page table: parallel arrays of the read ids, the HebrewBooks ids and the
+    names of the dafim, and an index of their names. The pages are numbered from 1, like the pages of a book.
+    """
+
     id: int
     read_id: int
     name: str
-    pages: list[MasechetPage]
+    page_read_ids: tuple[str, ...]
+    page_names: tuple[str, ...]
+    page_ids: array = field(init=False, repr=False, compare=False)
+    # Normalized name / read id / numeral -> page number
+    page_index: dict[str, int] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(
+            self, "page_ids", array("H", map(get_daf_id, self.page_read_ids))
+        )
+        index = {}
+        for page, (read_id, name) in enumerate(
+            zip(self.page_read_ids, self.page_names), start=1
+        ):
+            for key in _daf_keys(read_id, name):
+                index.setdefault(key, page)
+        object.__setattr__(self, "page_index", index)
 
     @property
     def total(self) -> int:
         """Get the total number of pages"""
-        return len(self.pages)
+        return len(self.page_read_ids)
+
+    def _validate_page(self, page: int) -> int:
+        if page < 1 or page > self.total:
+            raise IndexError(f"Page number must be between 1 and {self.total}")
+        return page - 1
+
+    def find_page(self, name: str) -> int | None:
+        """
+        Get the page number of a daf, None if there is no such daf
+
+        Args:
+            name: The name of the daf, its read id ('2b') or its numeral ('ב', 'ב.', 'ב:', 'ב ע"ב', '2a')
+        """
+        return self.page_index.get(_normalize_daf(name))
+
+    def get_page_name(self, page: int) -> str:
+        """
+        Get the name of a daf
+
+        Args:
+            page: The page number.
+        """
+        return self.page_names[self._validate_page(page)]
+
+    def get_page_pdf(self, page: int) -> str:
+        """
+        Get the daf's PDF URL
+
+        Args:
+            page: The page number.
+        """
+        page_id = self.page_ids[self._validate_page(page)]
+        return f"{BASE_URL}/pagefeed/hebrewbooks_org_{self.id}_{page_id}.pdf"
+
+    def get_page_img(self, page: int, width: int, height: int) -> str:
+        """
+        Get the daf's image URL
+
+        Args:
+            page: The page number.
+            width: The width of the image.
+            height: The height of the image.
+        """
+        page_id = self.page_ids[self._validate_page(page)]
+        return f"{BASE_URL}/reader/pagepngs/{self.id}_{page_id}_{width}_{height}.png"
+
+    def get_page_url(self, page: int, fmt: str = "pdf") -> str:
+        """
+        Get the daf's url
+
+        Args:
+            page: The page number.
+            fmt: The format of the page (pdf, or text)
+        """
+        read_id = self.page_read_ids[self._validate_page(page)]
+        return f"https://hebrewbooks.org/shas.aspx?mesechta={self.read_id}&daf={read_id}&format={fmt}"
+
+    def get_page(self, page: int) -> MasechetPage:
+        """
+        Get a daf (e.g. to get its content with ``api.get_page``)
+
+        Args:
+            page: The page number.
+        """
+        i = self._validate_page(page)
+        return MasechetPage(
+            read_id=self.page_read_ids[i],
+            masechet_id=self.id,
+            masechet_read_id=self.read_id,
+            name=self.page_names[i],
+        )
 
 
 @dataclass(slots=True)
@@ -183,7 +316,7 @@ class Book:
             height: The height of the image.
         """
         self._validate_page(page)
-        return f"https://beta.hebrewbooks.org/reader/pagepngs/{self.id}_{page}_{width}_{height}.png"
+        return f"{BASE_URL}/reader/pagepngs/{self.id}_{page}_{width}_{height}.png"
 
     def get_page_pdf(self, page: int) -> str:
         """
@@ -193,7 +326,7 @@ class Book:
             page: The page number.
         """
         self._validate_page(page)
-        return f"https://beta.hebrewbooks.org/pagefeed/hebrewbooks_org_{self.id}_{page}.pdf"
+        return f"{BASE_URL}/pagefeed/hebrewbooks_org_{self.id}_{page}.pdf"
 
     def get_page_url(self, page: int) -> str:
         """
@@ -0,0 +1,184 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Generic, Protocol, TypeVar
+from data import resilience
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+"""
+**Prebuilt files of the static upstream structures.**
+
+The Shas catalog (``data.shas_catalog``) and the tursa index (``data.tursa_index``) are crawled from upstream into
+compact JSON files, loaded once per process, and rebuilt in the background when they're older than their max age.
+The builds always ask upstream (see ``data.aioapi.revalidating``), since the disk cache keeps the scraped pages
+for good and would just hand the old ones back.
+"""
+
+
+class Built(Protocol):
+    @property
+    def age(self) -> float:
+        """The age of the content in seconds"""
+
+
+T = TypeVar("T", bound=Built)
+
+RETRY_AFTER = 60 * 60  # Seconds to wait after a failed refresh before trying again
+
+_NOT_LOADED = object()
+
+
+class PersistedFile(Generic[T]):
+    """
+    A JSON file built from upstream
+        - ``get`` loads it once per process, ``refresh`` rebuilds it from upstream, saves it and swaps it in
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path_setting: str,
+        max_age_setting: str,
+        build: Callable[[], Awaitable[T]],
+        dump: Callable[[T], dict[str, Any]],
+        load: Callable[[dict[str, Any]], T],
+        on_swap: Callable[[], None] | None = None,
+    ):
+        """
+        :param name: The name of the file in the logs (e.g. 'shas catalog')
+        :param path_setting: The setting of the path of the file (e.g. 'hb_shas_catalog_path')
+        :param max_age_setting: The setting of the number of days until the file is rebuilt
+        :param build: A coroutine function that builds the content from upstream
+        :param dump: A function that converts the content to JSON data
+        :param load: A function that converts the JSON data back to the content
+        :param on_swap: Called after a refreshed content is swapped in (e.g. to clear the caches built from it)
+        """
+        self.name = name
+        self.path_setting = path_setting
+        self.max_age_setting = max_age_setting
+        self._build = build
+        self._dump = dump
+        self._load = load
+        self._on_swap = on_swap
+        self._content: T | None | object = _NOT_LOADED
+        self._refreshing = False
+        self._failed_at: float | None = None
+        # Strong references to the refresh tasks, so they aren't garbage collected mid-way
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def path(self) -> Path:
+        """The path of the file"""
+        return Path(getattr(get_settings(), self.path_setting))
+
+    def get(self) -> T | None:
+        """Load the content from the file (once), None if there is no file or it's broken"""
+        if self._content is _NOT_LOADED:
+            try:
+                with self.path.open(encoding="utf-8") as f:
+                    self._content = self._load(json.load(f))
+            except FileNotFoundError:
+                logger.info(f"{self.name} not found at {self.path}, asking upstream")
+                self._content = None
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(
+                    f"{self.name} at {self.path} is broken ({e!r}), asking upstream"
+                )
+                self._content = None
+        return self._content
+
+    def save(self, content: T, path: Path | None = None):
+        """
+        Write the content to the file (atomically, so a running process never reads a partial file)
+
+        :param content: The content to write
+        :param path: The path of the file (default: ``path``)
+        """
+        path = path or self.path
+        # A unique temp file, so concurrent saves (e.g. the Telegram and the WhatsApp processes) don't write into each other's file
+        f = tempfile.NamedTemporaryFile(
+            "w",
+            encoding="utf-8",
+            dir=path.parent,
+            prefix=f"{path.name}.",
+            suffix=".tmp",
+            delete=False,
+        )
+        try:
+            with f:
+                json.dump(
+                    self._dump(content), f, ensure_ascii=False, separators=(",", ":")
+                )
+            os.chmod(f.name, 0o644)  # NamedTemporaryFile creates it private
+            os.replace(f.name, path)
+        except BaseException:
+            os.unlink(f.name)
+            raise
+
+    async def build(self) -> T:
+        """Build the content from upstream (not from the disk cache)"""
+        from data import aioapi
+
+        token = aioapi.revalidating.set(True)
+        try:
+            return await self._build()
+        except ExceptionGroup as e:
+            # The builds crawl in a TaskGroup: the first failure cancels the rest, report it
+            raise e.exceptions[0]
+        finally:
+            aioapi.revalidating.reset(token)
+
+    def _due(self) -> bool:
+        """Whether a refresh may start: none is running, and the last one didn't fail recently"""
+        return not self._refreshing and (
+            self._failed_at is None or time.monotonic() - self._failed_at > RETRY_AFTER
+        )
+
+    async def refresh(self):
+        """Rebuild the content from upstream, save it and swap it in (at most once per ``RETRY_AFTER`` if it fails)"""
+        if not self._due():
+            return
+        self._refreshing = True
+        try:
+            content = await self.build()
+            self.save(content)
+            self._content = content
+            if self._on_swap is not None:
+                self._on_swap()
+            self._failed_at = None
+            logger.info(f"{self.name} refreshed")
+        except Exception as e:
+            self._failed_at = time.monotonic()
+            logger.warning(
+                f"failed to refresh the {self.name}: {resilience.describe(e)}"
+            )
+        finally:
+            self._refreshing = False
+
+    def refresh_if_old(self, content: T):
+        """
+        Schedule a background refresh on the running event loop, if the content is too old
+
+        :param content: The loaded content
+        """
+        max_age = getattr(get_settings(), self.max_age_setting) * 24 * 60 * 60
+        if self._due() and content.age > max_age:
+            task = asyncio.get_running_loop().create_task(self.refresh())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def main(self) -> tuple[T, Path]:
+        """Build the file from the command line (``--output path``), and return the content and the path"""
+        parser = argparse.ArgumentParser(description=f"Build the {self.name} file")
+        parser.add_argument("--output", type=Path, default=None, help="the output file")
+        args = parser.parse_args()
+        built = asyncio.run(self.build())
+        self.save(built, args.output)
+        return built, args.output or self.path
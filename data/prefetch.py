@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from typing import Callable, Iterable
+from data import aioapi
+from data.api_cache import TTLCache, get_policy
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+"""
+**Predictive prefetch of pages.**
+
+Readers move through books one page at a time, so when page N is served, pages N+1 (and optionally N-1) are warmed
+in the background: their assets (PNG / PDF) are downloaded once and dropped, so upstream has them rendered and cached
+by the time the user presses Next. The budget is set in the settings:
+
+    - hb_prefetch_ahead / hb_prefetch_behind: How many pages to warm after / before the current one
+    - hb_prefetch_max_in_flight: How many assets may be warmed at once, extra pages are skipped (not queued)
+"""
+
+conf = get_settings()
+warmed = TTLCache(get_policy("prefetch"))
+# Only touched from the background event loop, so no locking is needed
+_tasks: set[asyncio.Task] = set()
+stats = {"warmed": 0, "skipped": 0, "failed": 0, "bytes": 0}
+
+
+def get_neighbours(page: int, total: int) -> list[int]:
+    """
+    Get the pages to warm around a page, nearest first
+
+    Args:
+        page: The page that is being read
+        total: The number of pages
+    """
+    pages = []
+    for i in range(1, max(conf.hb_prefetch_ahead, conf.hb_prefetch_behind) + 1):
+        if i <= conf.hb_prefetch_ahead and page + i <= total:
+            pages.append(page + i)
+        if i <= conf.hb_prefetch_behind and page - i >= 1:
+            pages.append(page - i)
+    return pages
+
+
+def warm_pages(page: int, total: int, get_url: Callable[[int], str]):
+    """
+    Warm the pages around the page that is being read, in the background (returns right away)
+
+    Args:
+        page: The page that is being read
+        total: The number of pages
+        get_url: A function that gets a page number and returns the url of its asset
+    """
+    if conf.hb_prefetch_max_in_flight <= 0:
+        return
+    urls = [
+        url
+        for p in get_neighbours(page, total)
+        if warmed.get(url := get_url(p)) is None
+    ]
+    if urls:
+        aioapi.run_background(_warm(urls))
+
+
+async def _warm(urls: Iterable[str]):
+    for url in urls:
+        if len(_tasks) >= conf.hb_prefetch_max_in_flight:
+            stats["skipped"] += 1
+            continue
+        warmed.set(url, True)
+        task = asyncio.create_task(_warm_url(url))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+
+
+async def _warm_url(url: str):
+    try:
+        stats["bytes"] += await aioapi.warm_asset(url)
+        stats["warmed"] += 1
+    except Exception as e:
+        # Let it be warmed again next time
+        warmed.delete(url)
+        stats["failed"] += 1
+        logger.debug(f"failed to warm {url}: {e}")
+
+
+def get_stats() -> dict[str, int]:
+    """Return the prefetch counters, how many assets are being warmed right now and how many were warmed recently"""
+    return {**stats, "in_flight": len(_tasks), "recent": warmed.get_stats()["entries"]}
@@ -0,0 +1,203 @@
+import logging
+import random
+import threading
+import time
+from typing import Any
+import httpx
+from data.enums import BaseEnum
+
+logger = logging.getLogger(__name__)
+
+"""
+**Resilience for the upstream calls.**
+
+When HebrewBooks stalls, the calls fail fast instead of piling up:
+
+    - Every failed attempt (connection errors, timeouts, 502/503/504) is retried a few times with jittered
+      exponential backoff, as long as the global ``RetryBudget`` allows it, so retries can't multiply the load on
+      an already unhealthy upstream.
+    - A ``CircuitBreaker`` per logical endpoint opens after consecutive failures: while it's open the calls fail
+      right away with ``UpstreamUnavailable`` (and ``data.aioapi`` serves the last known good response, if it has
+      one), and after ``reset_timeout`` one trial call is let through to check if upstream is back.
+"""
+
+# Upstream answers bad queries with 400 / 500, so only the gateway errors are failures
+RETRIABLE_STATUSES = frozenset((502, 503, 504))
+
+
+class UpstreamUnavailable(Exception):
+    """The circuit breaker of the endpoint is open"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} is unavailable, retry in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def is_failure(e: Exception) -> bool:
+    """Whether an exception means upstream is unhealthy (and the call may be retried)"""
+    return isinstance(e, (httpx.TransportError, UpstreamUnavailable)) or (
+        isinstance(e, httpx.HTTPStatusError)
+        and e.response.status_code in RETRIABLE_STATUSES
+    )
+
+
+def describe(e: Exception) -> str:
+    """
+    Describe an upstream error for the logs, without its request URL (it has the api key)
+
+    :param e: The exception (e.g. ``httpx.HTTPStatusError``)
+    """
+    if isinstance(e, httpx.HTTPStatusError):
+        return f"HTTP {e.response.status_code}"
+    if isinstance(e, httpx.HTTPError):
+        return type(e).__name__
+    return repr(e)
+
+
+def backoff(attempt: int, base: float = 0.2, cap: float = 5.0) -> float:
+    """
+    The number of seconds to wait before a retry ("full jitter" exponential backoff)
+
+    :param attempt: The number of the retry (1 for the first retry)
+    :param base: The maximum wait of the first retry
+    :param cap: The maximum wait of any retry
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class RetryBudget:
+    """
+    Limit the retries to a ratio of the calls
+        - Every call deposits ``ratio`` tokens, every retry withdraws one
+        - Safe to use from many threads
+    """
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 20):
+        """
+        :param ratio: The number of retries allowed per call
+        :param max_tokens: The maximum number of retries that can be saved up (and the initial number)
+        """
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.exhausted = 0
+
+    def deposit(self):
+        """Record a call"""
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        """Take a retry from the budget, False if it's exhausted"""
+        with self._lock:
+            if self._tokens < 1:
+                self.exhausted += 1
+                return False
+            self._tokens -= 1
+            self.retries += 1
+            return True
+
+    def get_stats(self) -> dict[str, Any]:
+        """Return the number of tokens left, the retries and how many were denied"""
+        return {
+            "tokens": round(self._tokens, 1),
+            "retries": self.retries,
+            "exhausted": self.exhausted,
+        }
+
+
+class BreakerState(BaseEnum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Fail fast while an endpoint is unhealthy
+        - Safe to use from many threads and event loops
+    """
+
+    def __init__(
+        self, name: str, failure_threshold: int = 5, reset_timeout: float = 30
+    ):
+        """
+        :param name: The name of the endpoint (for the errors and the logs)
+        :param failure_threshold: The number of consecutive failures that opens the breaker
+        :param reset_timeout: The number of seconds to wait before letting a trial call through
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self._changed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Raise ``UpstreamUnavailable`` if the call should fail fast"""
+        with self._lock:
+            if self.state is BreakerState.CLOSED:
+                return
+            # While open, and while a trial call is in flight (unless it's stuck), the calls fail fast
+            if (waited := time.monotonic() - self._changed_at) < self.reset_timeout:
+                raise UpstreamUnavailable(self.name, self.reset_timeout - waited)
+            self._set_state(BreakerState.HALF_OPEN)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state is not BreakerState.CLOSED:
+                self._set_state(BreakerState.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state is BreakerState.HALF_OPEN or (
+                self.state is BreakerState.CLOSED
+                and self.failures >= self.failure_threshold
+            ):
+                self.opened += 1
+                self._set_state(BreakerState.OPEN)
+
+    def _set_state(self, state: BreakerState):
+        logger.log(
+            logging.WARNING if state is BreakerState.OPEN else logging.INFO,
+            f"{self.name} circuit breaker: {self.state.value} -> {state.value}",
+        )
+        self.state = state
+        self._changed_at = time.monotonic()
+
+    def get_stats(self) -> dict[str, Any]:
+        """Return the state, for how long it's in it, the consecutive failures and how many times it opened"""
+        return {
+            "state": self.state.value,
+            "for": f"{time.monotonic() - self._changed_at:.0f}s",
+            "failures": self.failures,
+            "opened": self.opened,
+        }
+
+
+retry_budget = RetryBudget()
+breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Get (or create) the circuit breaker of a logical endpoint (e.g. 'book_info')"""
+    with _breakers_lock:
+        if (breaker := breakers.get(name)) is None:
+            breaker = breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def get_stats() -> dict[str, dict[str, Any]]:
+    """Return the state of every circuit breaker, by endpoint, and the retry budget"""
+    return {
+        **{name: breaker.get_stats() for name, breaker in breakers.items()},
+        "retry_budget": retry_budget.get_stats(),
+    }
@@ -0,0 +1,35 @@
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+
+    PARSER = "lxml"
+except ImportError:  # lxml is optional, html.parser is pure Python
+    PARSER = "html.parser"
+
+"""
+Targeted HTML parsing for the HebrewBooks.org pages we scrape.
+
+The pages are big, but we only need a few elements of each one, so the parser builds a tree only for the elements
+that match a ``SoupStrainer`` (everything else is skipped while parsing), using lxml when it's installed.
+"""
+
+# shas.aspx: the masechtot list
+MASECHTOT = SoupStrainer("select", id="cpMstr_ddlMesechtas")
+# shas.aspx?mesechta=: the masechet id (in the image container) and the dafim list
+MASECHET = SoupStrainer(id=["shaspngcont", "cpMstr_ddlDafim"])
+# shas.aspx?mesechta=&daf=&format=text: the gmara, rashi and tosfot texts
+PAGE_TEXT = SoupStrainer("div", class_=["shastext2", "shastext3", "shastext4"])
+# tursa: the root menu
+TURSA_MENU = SoupStrainer("div", id="menu0")
+
+
+def parse(html: str | bytes, only: SoupStrainer) -> BeautifulSoup:
+    """
+    Parse only the elements of a page that match a strainer
+
+    Args:
+        html: The page
+        only: The strainer of the elements to keep (e.g. ``MASECHTOT``)
+    """
+    return BeautifulSoup(html, PARSER, parse_only=only)
@@ -0,0 +1,145 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from data.disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+"""
+**Second-level cache shared by the bot processes on the same host.**
+
+The Telegram bot, the WhatsApp webhook and every uvicorn worker have their own ``MemoryCache``. With a
+``SharedCache`` (``HB_SHARED_CACHE_PATH``), a miss in one process is looked up in a SQLite file they all share before
+running the function, and every ``@cache.invalidate`` is appended to an invalidations table of the same file. Each
+process polls the table (see ``MemoryCache.poll_interval``) and drops the invalidated entries from its own memory, so
+the hot reads stay in-process while the invalidations take effect everywhere.
+"""
+
+
+class SharedCache:
+    """
+    SQLite-backed cache with an invalidation broadcast
+        - The values are pickled into a ``DiskCache``, the invalidations are appended to a table of the same file
+        - Safe to use from many threads and processes on the same host
+    """
+
+    def __init__(
+        self, path: str, max_bytes: int = 64 * 2**20, retention: float = 60 * 60
+    ):
+        """
+        :param path: The path of the SQLite file
+        :param max_bytes: The maximum total size of the (compressed) values
+        :param retention: The number of seconds to keep the invalidations, for the processes that poll them
+        """
+        self.values = DiskCache(path, max_bytes=max_bytes)
+        self.retention = retention
+        # Every process skips its own invalidations
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS invalidations ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT NOT NULL, "
+            "cache_name BLOB NOT NULL, cache_id BLOB, at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        # The invalidations from before this process started don't concern it
+        self._seq = self._conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM invalidations"
+        ).fetchone()[0]
+        logger.debug(f"shared cache initialized at {path}")
+
+    @staticmethod
+    def _prefix(cache_name: Hashable) -> str:
+        return f"{cache_name!r}|"
+
+    def get(self, cache_name: Hashable, cache_id: Hashable) -> Tuple[bool, Any]:
+        """
+        Get cached data
+
+        :param cache_name: The cache name to get the data from
+        :param cache_id: The cache id to get the data from
+        :return: Whether the data is cached, and the data
+        """
+        value = self.values.get(f"{self._prefix(cache_name)}{cache_id!r}")
+        if value is None:
+            return False, None
+        return True, pickle.loads(value)
+
+    def set(
+        self,
+        cache_name: Hashable,
+        cache_id: Hashable,
+        cache_data: Any,
+        ttl: Optional[float] = None,
+    ):
+        """
+        Set cached data
+
+        :param cache_name: The cache name to set the data to
+        :param cache_id: The cache id to set the data to
+        :param cache_data: The data to cache (must be picklable)
+        :param ttl: The number of seconds to keep the data, None to keep it until it's evicted
+        """
+        self.values.set(
+            f"{self._prefix(cache_name)}{cache_id!r}",
+            pickle.dumps(cache_data, protocol=pickle.HIGHEST_PROTOCOL),
+            ttl=ttl,
+        )
+
+    def invalidate(self, cache_name: Hashable, cache_id: Optional[Hashable] = None):
+        """
+        Delete cached data, and tell the other processes to delete it from their memory
+
+        :param cache_name: The cache name to delete the data from
+        :param cache_id: The cache id to delete the data from, if None, all data from the cache name will be deleted
+        """
+        if cache_id is None:
+            self.values.delete_prefix(self._prefix(cache_name))
+        else:
+            self.values.delete(f"{self._prefix(cache_name)}{cache_id!r}")
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO invalidations (origin, cache_name, cache_id, at) VALUES (?, ?, ?, ?)",
+                (
+                    self.origin,
+                    pickle.dumps(cache_name),
+                    pickle.dumps(cache_id) if cache_id is not None else None,
+                    time.time(),
+                ),
+            )
+            self._conn.commit()
+
+    def poll(self) -> List[Tuple[Hashable, Optional[Hashable]]]:
+        """
+        Get the invalidations of the other processes since the last poll
+
+        :return: The invalidated cache names and cache ids (None for the whole cache name)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, origin, cache_name, cache_id FROM invalidations WHERE seq > ? ORDER BY seq",
+                (self._seq,),
+            ).fetchall()
+            if not rows:
+                return []
+            self._seq = rows[-1][0]
+            self._conn.execute(
+                "DELETE FROM invalidations WHERE at < ?",
+                (time.time() - self.retention,),
+            )
+            self._conn.commit()
+        return [
+            (pickle.loads(name), pickle.loads(cache_id) if cache_id else None)
+            for _, origin, name, cache_id in rows
+            if origin != self.origin
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return the stats of the values, and the last invalidation seen"""
+        return {**self.values.get_stats(), "seq": self._seq}
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any
+from data.persisted import PersistedFile
+
+"""
+**Prebuilt Shas catalog.**
+
+The Shas structure (the masechtot, their HebrewBooks ids and the dafim of each one) is static, so instead of
+scraping ``shas.aspx`` twice for every masechet, it's built once into a compact JSON file:
+
+    python -m data.shas_catalog [--output path]
+
+``data.aioapi.get_masechtot`` and ``get_masechet`` read it (``catalog_file.get()``), and scrape ``shas.aspx`` only
+if the file is missing. When the file is older than ``hb_shas_catalog_max_age_days``, it's rebuilt in the background
+(see ``data.persisted``).
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogMasechet:
+    read_id: int  # The id of the masechet in shas.aspx (index in the masechtot list + 1)
+    id: int  # The HebrewBooks id of the masechet
+    name: str
+    page_read_ids: list[str]  # The dafim read ids (e.g. '2', '2b')
+    page_names: list[str]  # The dafim names, in the same order as page_read_ids
+
+
+@dataclass(frozen=True, slots=True)
+class Catalog:
+    generated_at: float
+    masechtot: list[CatalogMasechet]
+
+    @property
+    def age(self) -> float:
+        """The age of the catalog in seconds"""
+        return time.time() - self.generated_at
+
+
+def _dump(catalog: Catalog) -> dict[str, Any]:
+    return {
+        "generated_at": catalog.generated_at,
+        # Positional rows, in the CatalogMasechet fields order, to keep the file compact
+        "masechtot": [
+            [m.read_id, m.id, m.name, m.page_read_ids, m.page_names]
+            for m in catalog.masechtot
+        ],
+    }
+
+
+def _load(raw: dict[str, Any]) -> Catalog:
+    return Catalog(
+        generated_at=raw["generated_at"],
+        masechtot=[CatalogMasechet(*m) for m in raw["masechtot"]],
+    )
+
+
+async def build() -> Catalog:
+    """Build the catalog by scraping shas.aspx"""
+    from data import aioapi
+
+    masechtot = await aioapi.scrape_masechtot()
+    # A failed masechet cancels the rest
+    async with asyncio.TaskGroup() as group:
+        tasks = [
+            group.create_task(aioapi.scrape_masechet(i, masechet=m))
+            for i, m in enumerate(masechtot, start=1)
+        ]
+    masechot = [task.result() for task in tasks]
+    return Catalog(
+        generated_at=time.time(),
+        masechtot=[
+            CatalogMasechet(
+                read_id=base.id,
+                id=masechet.id,
+                name=base.name,
+                page_read_ids=list(masechet.page_read_ids),
+                page_names=list(masechet.page_names),
+            )
+            for base, masechet in zip(masechtot, masechot)
+        ],
+    )
+
+
+def _on_swap():
+    from data import aioapi
+
+    # The masechtot and the masechet caches switch to the new catalog together
+    aioapi.get_masechtot.cache.clear()
+    aioapi.get_masechet.cache.clear()
+
+
+catalog_file = PersistedFile[Catalog](
+    name="shas catalog",
+    path_setting="hb_shas_catalog_path",
+    max_age_setting="hb_shas_catalog_max_age_days",
+    build=build,
+    dump=_dump,
+    load=_load,
+    on_swap=_on_swap,
+)
+
+
+if __name__ == "__main__":
+    built, path = catalog_file.main()
+    print(
+        f"{len(built.masechtot)} masechtot, "
+        f"{sum(len(m.page_read_ids) for m in built.masechtot)} dafim -> {path}"
+    )
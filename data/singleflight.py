@@ -0,0 +1,119 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple, TypeVar, Awaitable
+
+T = TypeVar("T")
+
+
+class _Abandoned(Exception):
+    """The leader of a call was cancelled, one of the waiting callers runs it instead"""
+
+
+class SingleFlight:
+    """
+    Collapse concurrent identical calls into one.
+
+    While a call for a key is in flight, every other call for the same key waits for it and gets its result (or
+    exception) instead of running again. If the caller that runs it is cancelled, one of the waiting callers runs
+    it instead. Works across threads and event loops, so the sync and the async callers share the in-flight calls.
+
+    Usage:
+        >>> flight = SingleFlight()
+        >>> flight.do('book-1', fetch_book, 1)  # from a thread
+        >>> await flight.ado('book-1', afetch_book, 1)  # from a coroutine
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.calls = 0
+        self.collapsed = 0
+
+    def _join(self, key: Hashable, rejoin: bool = False) -> Tuple[Future, bool]:
+        """Get the future of the key, and whether the caller is the one that should run the call"""
+        with self._lock:
+            if not rejoin:
+                self.calls += 1
+            if (future := self._calls.get(key)) is not None:
+                if not rejoin:
+                    self.collapsed += 1
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _leave(self, key: Hashable, future: Future):
+        with self._lock:
+            # A caller that took over an abandoned call may have registered its own future already
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def do(self, key: Hashable, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Run ``func(*args, **kwargs)``, or wait for the in-flight call of the same key
+
+        :param key: The key that identifies identical calls
+        :param func: The function to run
+        """
+        rejoin = False
+        while True:
+            future, leader = self._join(key, rejoin)
+            if leader:
+                break
+            try:
+                return future.result()
+            except _Abandoned:
+                rejoin = True
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._leave(key, future)
+
+    async def ado(
+        self, key: Hashable, func: Callable[..., Awaitable[T]], *args, **kwargs
+    ) -> T:
+        """
+        Await ``func(*args, **kwargs)``, or wait for the in-flight call of the same key
+
+        :param key: The key that identifies identical calls
+        :param func: The coroutine function to await
+        """
+        rejoin = False
+        while True:
+            future, leader = self._join(key, rejoin)
+            if leader:
+                break
+            try:
+                # Shielded, so a cancelled follower doesn't cancel the call for everyone else
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except _Abandoned:
+                rejoin = True
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            # Only the leader was cancelled, the first waiting caller to rejoin runs the call again
+            self._leave(key, future)
+            future.set_exception(_Abandoned())
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._leave(key, future)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return the number of calls, how many of them were collapsed and how many are in flight right now"""
+        return {
+            "calls": self.calls,
+            "collapsed": self.collapsed,
+            "in_flight": len(self._calls),
+        }
@@ -0,0 +1,129 @@
+import threading
+from typing import Any
+from data.api_cache import TTLCache, CachePolicy, get_policy
+
+"""
+**Local prefix autocomplete for the HebrewBooks suggestions.**
+
+Every refinement of a query (``ד``, ``דו``, ``דוד``...) would be a fresh upstream call, but once upstream returned
+fewer suggestions than asked for a prefix, that list is complete: the suggestions of any longer query are the ones
+that start with it. So the suggestions of each ``src`` (title / auth / ocr) are kept in a prefix trie, with the
+prefixes whose suggestions it holds completely, and longer queries are answered from the trie.
+
+It assumes, like upstream, that the suggestions of a query are the ones that start with it (ignoring case and
+extra whitespace).
+"""
+
+MAX_NODES = 500_000  # Per trie, it's cleared when it grows past it
+_END = ""  # Key of the (suggestion, rank) of the node a suggestion ends at, chars are never empty
+
+
+def normalize(query: str) -> str:
+    """Normalize a query or a suggestion for matching"""
+    return " ".join(query.casefold().split())
+
+
+class SuggestionTrie:
+    """
+    Prefix trie of the suggestions of one ``src``
+        - Safe to use from many threads
+    """
+
+    def __init__(self, policy: CachePolicy, max_nodes: int = MAX_NODES):
+        """
+        :param policy: The policy of the complete prefixes (how many to keep and for how long)
+        :param max_nodes: The maximum number of nodes
+        """
+        self.max_nodes = max_nodes
+        self._lock = threading.Lock()
+        self._root: dict[str, Any] = {}
+        self._nodes = 0
+        # normalized prefix -> True, for the prefixes whose suggestions the trie holds completely
+        self._complete = TTLCache(policy)
+
+    def add(self, prefix: str, suggestions: list[str], complete: bool):
+        """
+        Add the suggestions upstream returned for a prefix
+
+        :param prefix: The query the suggestions were returned for
+        :param suggestions: The suggestions, best first
+        :param complete: Whether these are all the suggestions of the prefix (upstream returned less than the limit)
+        """
+        with self._lock:
+            if self._nodes > self.max_nodes:
+                self._root.clear()
+                self._nodes = 0
+                self._complete.clear()
+            if complete:
+                # The list replaces whatever the trie held under the prefix (e.g. from before it expired)
+                self._clear_subtree(normalize(prefix))
+            for rank, suggestion in enumerate(suggestions):
+                node = self._root
+                for char in normalize(suggestion):
+                    if (child := node.get(char)) is None:
+                        child = node[char] = {}
+                        self._nodes += 1
+                    node = child
+                node[_END] = (suggestion, rank)
+        if complete:
+            self._complete.set(normalize(prefix), True)
+
+    def _clear_subtree(self, prefix: str):
+        """Drop the suggestions that start with a (normalized) prefix, the caller holds the lock"""
+        node = self._root
+        for char in prefix:
+            if (node := node.get(char)) is None:
+                return
+        stack = [node]
+        while stack:
+            for char, child in stack.pop().items():
+                if char != _END:
+                    self._nodes -= 1
+                    stack.append(child)
+        node.clear()
+
+    def find(self, query: str, limit: int) -> list[str] | None:
+        """
+        Get the suggestions of a query from the trie
+
+        :param query: The query
+        :param limit: The maximum number of suggestions
+        :return: The suggestions, or None if the trie doesn't hold all of them (ask upstream)
+        """
+        query = normalize(query)
+        if not any(
+            self._complete.get(query[:i]) is not None for i in range(len(query), 0, -1)
+        ):
+            return None
+        with self._lock:
+            node = self._root
+            for char in query:
+                if (node := node.get(char)) is None:
+                    return []
+            found, stack = [], [node]
+            while stack:
+                node = stack.pop()
+                for char, child in node.items():
+                    if char == _END:
+                        found.append(child)
+                    else:
+                        stack.append(child)
+        found.sort(key=lambda s: s[1])
+        return [suggestion for suggestion, _ in found[:limit]]
+
+    def get_stats(self) -> dict[str, Any]:
+        """Return the number of nodes and of complete prefixes"""
+        return {
+            "nodes": self._nodes,
+            "complete_prefixes": self._complete.get_stats()["entries"],
+        }
+
+
+tries: dict[str, SuggestionTrie] = {
+    src: SuggestionTrie(get_policy("suggestions")) for src in ("title", "auth", "ocr")
+}
+
+
+def get_stats() -> dict[str, dict[str, Any]]:
+    """Return the stats of every trie, by src"""
+    return {src: trie.get_stats() for src, trie in tries.items()}
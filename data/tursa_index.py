@@ -0,0 +1,123 @@
+import asyncio
+import time
+from typing import Any, Iterable
+from data.models import Tursa
+from data.persisted import PersistedFile
+
+"""
+**Materialized Tur & Shulchan Aruch (tursa) tree.**
+
+The tursa tree is crawled once from ``/tursa`` and ``/generic.aspx?tursa=`` into a JSON file:
+
+    python -m data.tursa_index [--output path]
+
+and loaded into a ``TursaIndex``: any node, its parent, its ancestors and its children are resolved in O(1)
+instead of crawling upstream and walking the lists on every click. ``data.aioapi.get_tursa`` reads it
+(``index_file.get()``), and crawls upstream only if the file is missing. When the file is older than
+``hb_tursa_index_max_age_days``, it's rebuilt in the background (see ``data.persisted``).
+"""
+
+BUILD_FAN_OUT = 10  # Max concurrent generic.aspx requests while building
+
+
+class TursaIndex:
+    """Id-to-node index of the tursa tree, with parent pointers and the children of every node"""
+
+    def __init__(self, generated_at: float, nodes: Iterable[tuple[Tursa, str | None]]):
+        """
+        :param generated_at: When the tree was crawled (a timestamp)
+        :param nodes: The nodes and the ids of their parents (None for the roots), the children in their order
+        """
+        self.generated_at = generated_at
+        self.nodes: dict[str, Tursa] = {}
+        self.parents: dict[str, str | None] = {}
+        # parent id (None for the roots) -> children
+        self.children: dict[str | None, list[Tursa]] = {}
+        for tursa, parent_id in nodes:
+            self.nodes[str(tursa.id)] = tursa
+            self.parents[str(tursa.id)] = parent_id
+            self.children.setdefault(parent_id, []).append(tursa)
+
+    @property
+    def age(self) -> float:
+        """The age of the index in seconds"""
+        return time.time() - self.generated_at
+
+    def get_parent(self, tursa_id: str) -> Tursa | None:
+        """Get the parent of a node, None for the roots (KeyError if the node doesn't exist)"""
+        parent_id = self.parents[str(tursa_id)]
+        return self.nodes[parent_id] if parent_id is not None else None
+
+    def get_ancestors(self, tursa_id: str) -> list[Tursa]:
+        """Get the ancestors of a node, the parent first (KeyError if the node doesn't exist)"""
+        ancestors = []
+        while (parent_id := self.parents[str(tursa_id)]) is not None:
+            ancestors.append(self.nodes[parent_id])
+            tursa_id = parent_id
+        return ancestors
+
+
+def _dump(index: TursaIndex) -> dict[str, Any]:
+    return {
+        "generated_at": index.generated_at,
+        # Positional rows (id, name, has_children, parent id), parents before their children
+        "nodes": [
+            [t.id, t.name, t.has_children, index.parents[str(t.id)]]
+            for children in index.children.values()
+            for t in children
+        ],
+    }
+
+
+def _load(raw: dict[str, Any]) -> TursaIndex:
+    return TursaIndex(
+        generated_at=raw["generated_at"],
+        nodes=(
+            (Tursa(id=id_, name=name, has_children=has_children), parent_id)
+            for id_, name, has_children, parent_id in raw["nodes"]
+        ),
+    )
+
+
+async def build() -> TursaIndex:
+    """Build the index by crawling the tursa tree upstream"""
+    from data import aioapi
+
+    semaphore = asyncio.Semaphore(BUILD_FAN_OUT)
+    nodes: list[tuple[Tursa, str | None]] = []
+
+    async def crawl(parent: Tursa | None, group: asyncio.TaskGroup):
+        async with semaphore:
+            children = await aioapi.scrape_tursa(parent.id if parent else None)
+        parent_id = str(parent.id) if parent else None
+        nodes.extend((child, parent_id) for child in children)
+        for child in children:
+            if child.has_children:
+                group.create_task(crawl(child, group))
+
+    # A failed request cancels the rest of the crawl
+    async with asyncio.TaskGroup() as group:
+        group.create_task(crawl(None, group))
+    return TursaIndex(generated_at=time.time(), nodes=nodes)
+
+
+def _on_swap():
+    from data import aioapi
+
+    aioapi.get_tursa.cache.clear()
+
+
+index_file = PersistedFile[TursaIndex](
+    name="tursa index",
+    path_setting="hb_tursa_index_path",
+    max_age_setting="hb_tursa_index_max_age_days",
+    build=build,
+    dump=_dump,
+    load=_load,
+    on_swap=_on_swap,
+)
+
+
+if __name__ == "__main__":
+    built, path = index_file.main()
+    print(f"{len(built.nodes)} nodes -> {path}")
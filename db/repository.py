@@ -7,15 +7,34 @@ from db.tables import TgUser, Stats, WaUser, get_session
 # from functools import lru_cache
 # from urllib import parse
 
-
-@cache.cachable(cache_name="is_tg_user_exists", params=("tg_id",))
+HOUR, DAY = 60 * 60, 24 * 60 * 60
+# The limits of the users caches, so they stay flat no matter how many users we see.
+# The flags are small and hot (every update checks them), the users rows are bigger.
+USER_FLAGS_CACHE_SIZE = 100_000
+USERS_CACHE_SIZE = 20_000
+# Unknown users (e.g. inline queries from people who never pressed /start) are cached for a shorter time
+UNKNOWN_USER_TTL = 5 * 60
+
+
+@cache.cachable(
+    cache_name="is_tg_user_exists",
+    params=("tg_id",),
+    max_entries=USER_FLAGS_CACHE_SIZE,
+    ttl=DAY,
+)
 def is_tg_user_exists(*, tg_id: int) -> bool:
     """Check if tg user exists"""
     with get_session() as session:
         return session.query(exists().where(TgUser.tg_id == tg_id)).scalar()
 
 
-@cache.cachable(cache_name="is_tg_user_active", params=("tg_id",))
+@cache.cachable(
+    cache_name="is_tg_user_active",
+    params=("tg_id",),
+    max_entries=USER_FLAGS_CACHE_SIZE,
+    ttl=HOUR,
+    negative_ttl=UNKNOWN_USER_TTL,
+)
 def is_tg_user_active(*, tg_id: int) -> bool:
     """Check if tg user active"""
     with get_session() as session:
@@ -24,6 +43,7 @@ def is_tg_user_active(*, tg_id: int) -> bool:
 
 @cache.invalidate(cache_name="tg_user", params=("tg_id",))
 @cache.invalidate(cache_name="is_tg_user_exists", params=("tg_id",))
+@cache.invalidate(cache_name="is_tg_user_active", params=("tg_id",))
 def add_tg_user(*, tg_id: int, lang: str, active: bool = True) -> bool:
     """Add new tg user to db, return True if new user added"""
     with get_session() as session:
@@ -36,7 +56,13 @@ def add_tg_user(*, tg_id: int, lang: str, active: bool = True) -> bool:
             return False
 
 
-@cache.cachable(cache_name="tg_user", params=["tg_id"])
+@cache.cachable(
+    cache_name="tg_user",
+    params=["tg_id"],
+    max_entries=USERS_CACHE_SIZE,
+    ttl=HOUR,
+    negative_ttl=UNKNOWN_USER_TTL,
+)
 def get_tg_user(*, tg_id: int) -> type[TgUser] | None:
     """Get tg user"""
     with get_session() as session:
@@ -65,14 +91,25 @@ def get_tg_users_count(active: bool | None = None, lang_code: str = None) -> int
         )
 
 
-@cache.cachable(cache_name="is_wa_user_exists", params=("wa_id",))
+@cache.cachable(
+    cache_name="is_wa_user_exists",
+    params=("wa_id",),
+    max_entries=USER_FLAGS_CACHE_SIZE,
+    ttl=DAY,
+)
 def is_wa_user_exists(*, wa_id: str) -> bool:
     """Check if wa user exists"""
     with get_session() as session:
         return session.query(exists().where(WaUser.wa_id == wa_id)).scalar()
 
 
-@cache.cachable(cache_name="is_wa_user_active", params=("wa_id",))
+@cache.cachable(
+    cache_name="is_wa_user_active",
+    params=("wa_id",),
+    max_entries=USER_FLAGS_CACHE_SIZE,
+    ttl=HOUR,
+    negative_ttl=UNKNOWN_USER_TTL,
+)
 def is_wa_user_active(*, wa_id: str) -> bool:
     """Check if wa user active"""
     with get_session() as session:
@@ -81,6 +118,7 @@ def is_wa_user_active(*, wa_id: str) -> bool:
 
 @cache.invalidate(cache_name="wa_user", params=("wa_id",))
 @cache.invalidate(cache_name="is_wa_user_exists", params=("wa_id",))
+@cache.invalidate(cache_name="is_wa_user_active", params=("wa_id",))
 def add_wa_user(*, wa_id: str, lang: str, active: bool = True) -> bool:
     """Add new wa user to db, return True if new user added"""
     with get_session() as session:
@@ -93,7 +131,13 @@ def add_wa_user(*, wa_id: str, lang: str, active: bool = True) -> bool:
             return False
 
 
-@cache.cachable(cache_name="wa_user", params=("wa_id",))
+@cache.cachable(
+    cache_name="wa_user",
+    params=("wa_id",),
+    max_entries=USERS_CACHE_SIZE,
+    ttl=HOUR,
+    negative_ttl=UNKNOWN_USER_TTL,
+)
 def get_wa_user(*, wa_id: str) -> type[WaUser] | None:
     """Get wa user"""
     with get_session() as session:
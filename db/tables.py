@@ -73,3 +73,4 @@ BaseTable.metadata.create_all(engine)
 with get_session() as session:
     if not session.query(Stats).count():
         session.add(Stats())
+        session.commit()
@@ -34,6 +34,24 @@ app = Client(
 )
 
 app.add_handler(MessageHandler(utils.start, filters=filters.command(Menu.START)))
+app.add_handler(
+    MessageHandler(
+        utils.show_cache_stats,
+        filters=filters.command(Menu.CACHE) & filters.user(cfg.tg_admins),
+    )
+)
+app.add_handler(
+    MessageHandler(
+        utils.show_upstream_stats,
+        filters=filters.command(Menu.UPSTREAM) & filters.user(cfg.tg_admins),
+    )
+)
+app.add_handler(
+    MessageHandler(
+        utils.show_metrics,
+        filters=filters.command(Menu.METRICS) & filters.user(cfg.tg_admins),
+    )
+)
 
 if cfg.under_maintenance:
     app.add_handler(
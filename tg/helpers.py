@@ -30,6 +30,9 @@ class Menu:
     BROWSE = "browse_menu"
     STATS = "stats"
     CHOOSE_LANG = "choose_lang"
+    CACHE = "cache"
+    UPSTREAM = "upstream"
+    METRICS = "metrics"
     CONTACT_URL = "https://t.me/davidlev"
     HEBREWBOOKS_SITE_URL = "https://hebrewbooks.org"
 
@@ -38,7 +41,9 @@ MESSAGE_SEARCH_FILTER = (
     filters.text
     & ~filters.via_bot
     & ~filters.reply
-    & ~filters.command([Menu.START, Menu.BROADCAST])
+    & ~filters.command(
+        [Menu.START, Menu.BROADCAST, Menu.CACHE, Menu.UPSTREAM, Menu.METRICS]
+    )
     & ~filters.create(lambda _, __, msg: msg.text.isdigit())
     & ~filters.create(lambda _, __, ms: len(ms.text) <= 2)
 )
@@ -51,26 +56,38 @@ def is_admin(user_id: int) -> bool:
     return user_id in config.get_settings().tg_admins
 
 
-def get_book_text(
-    book: Book, page: int | None = None, read_mode: ReadMode | None = None
-) -> str:
+def get_book_page_url(book: Book, page: int | None, read_mode: ReadMode | None) -> str:
     """
-    Get the text for a book.
+    Get the url of a book page asset.
 
     Args:
         book: The book.
         page: The page number.
-        read_mode: The read mode.
+        read_mode: The read mode (None for the whole book PDF).
     """
     match read_mode:
         case ReadMode.PDF:
-            url = book.get_page_pdf(page)
+            return book.get_page_pdf(page)
         case ReadMode.IMAGE:
-            url = book.get_page_img(page, width=2138, height=3038)
+            return book.get_page_img(page, width=2138, height=3038)
         case None:
-            url = book.pdf_url
+            return book.pdf_url
         case _:
             raise ValueError(f"Invalid read mode: {read_mode}")
+
+
+def get_book_text(
+    book: Book, page: int | None = None, read_mode: ReadMode | None = None
+) -> str:
+    """
+    Get the text for a book.
+
+    Args:
+        book: The book.
+        page: The page number.
+        read_mode: The read mode.
+    """
+    url = get_book_page_url(book=book, page=page, read_mode=read_mode)
     return "".join(
         (
             f"{RTL}[📚]({url}) {book.title}\n",
@@ -82,24 +99,40 @@ def get_book_text(
     )
 
 
-def get_masechet_page_text(masechet: Masechet, page: int, read_mode: ReadMode) -> str:
+def get_masechet_page_url(masechet: Masechet, page: int, read_mode: ReadMode) -> str:
     """
-    Get the text for a masechet.
+    Get the url of a masechet page asset.
 
     Args:
         masechet: The masechet.
         page: The page number.
         read_mode: The read mode.
     """
-    page_obj = masechet.pages[page - 1]
     match read_mode:
         case ReadMode.PDF:
-            url = page_obj.pdf_url
+            return masechet.get_page_pdf(page)
         case ReadMode.IMAGE:
-            url = page_obj.get_page_img(width=2138, height=3038)
+            return masechet.get_page_img(page, width=2138, height=3038)
         case _:
             raise ValueError(f"Invalid read mode: {read_mode}")
-    return "".join((f"{RTL}[📚]({url}) {masechet.name}\n", f"{RTL}📄 {page_obj.name}"))
+
+
+def get_masechet_page_text(masechet: Masechet, page: int, read_mode: ReadMode) -> str:
+    """
+    Get the text for a masechet.
+
+    Args:
+        masechet: The masechet.
+        page: The page number.
+        read_mode: The read mode.
+    """
+    url = get_masechet_page_url(masechet=masechet, page=page, read_mode=read_mode)
+    return "".join(
+        (
+            f"{RTL}[📚]({url}) {masechet.name}\n",
+            f"{RTL}📄 {masechet.get_page_name(page)}",
+        )
+    )
 
 
 def get_tursa_text(tursa: Tursa, previous_tursa: Tursa) -> str:
@@ -261,11 +294,9 @@ def next_previous_buttons(
         )
     elif read_clb.book_type == BookType.MASECHET:
         masechet = api.get_masechet(int(read_clb.id))
-        current_page = masechet.pages[page - 1]
-        last_page = masechet.pages[-1]
         buttons.append(
             InlineKeyboardButton(
-                text=f"< {current_page.name} / {last_page.name} >",
+                text=f"< {masechet.get_page_name(page)} / {masechet.page_names[-1]} >",
                 callback_data=JumpToPage(
                     id=int(read_clb.id),
                     page=page,
@@ -9,7 +9,7 @@ from pyrogram.types import (
     CallbackQuery,
 )
 import data
-from data import api
+from data import api, api_cache
 from data.models import Book
 from db import repository
 from db.repository import StatsType
@@ -19,6 +19,13 @@ from data.strings import String as s  # noqa
 from data.callbacks import SearchNavigation, ShowBook, ReadBook
 from data.enums import BookType, ReadMode, Language
 
+# The number of seconds Telegram may cache an inline answer on its side
+INLINE_CACHE_TIME = 300
+
+# The ready-to-send inline answers (query.answer kwargs) and the stats to increase when they are sent,
+# by normalized query, offset and language
+inline_answers = api_cache.get_cache("inline_answers")
+
 
 def empty_search(_: Client, query: InlineQuery):
     """Show a message when the user searches for nothing"""
@@ -88,77 +95,110 @@ def _get_book_article(
     )
 
 
-def search_books_inline(_: Client, query: InlineQuery):
+def _get_inline_answer(
+    query: InlineQuery, text: str, offset: int
+) -> tuple[dict, StatsType | None]:
     """
-    Search books inline
+    Internal function to build the answer of an inline query
 
-    query.query format: "{title}" / "{title}:{author}"
+    Args:
+        query: The inline query
+        text: The normalized query text
+        offset: The offset of the results
+
+    Returns:
+        The ``query.answer`` kwargs, and the stats to increase when it's sent
     """
-    if query.offset is not None and query.offset == "0":
-        return  # No more results
-    user_id, user_lang = query.from_user.id, query.from_user.language_code
-    if not repository.is_tg_user_exists(tg_id=user_id):
-        utils.on_unregistered_user(user_lang=user_lang, query=query)
-        return
+    user_id = query.from_user.id
     if all(
-        part.isdigit() for part in query.query.split(":")
+        part.isdigit() for part in text.split(":")
     ):  # The user searched for a book id or a book id:page
-        if ":" in query.query:
-            book_id, page = map(int, query.query.split(":"))
+        if ":" in text:
+            book_id, page = map(int, text.split(":"))
             page = page or 1
         else:
-            book_id, page = int(query.query), 1
+            book_id, page = int(text), 1
         book = api.get_book(book_id)
         if book is None:
-            query.answer(
-                results=[],
-                switch_pm_text=gs(user_id=user_id, string=s.BOOK_NOT_FOUND),
-                switch_pm_parameter="start",
+            return (
+                dict(
+                    results=[],
+                    switch_pm_text=gs(user_id=user_id, string=s.BOOK_NOT_FOUND),
+                    switch_pm_parameter="start",
+                ),
+                None,
             )
-            return
         if page > book.pages:
-            query.answer(
-                results=[],
+            return (
+                dict(
+                    results=[],
+                    switch_pm_text=gs(
+                        user_id=user_id,
+                        string=s.PAGE_NOT_EXIST_CHOOSE_BETWEEN_X_Y,
+                        x=1,
+                        y=book.pages,
+                    ),
+                    switch_pm_parameter="start",
+                ),
+                None,
+            )
+        return (
+            dict(
+                results=[_get_book_article(book=book, query=query, read_at_page=page)],
                 switch_pm_text=gs(
-                    user_id=user_id,
-                    string=s.PAGE_NOT_EXIST_CHOOSE_BETWEEN_X_Y,
-                    x=1,
-                    y=book.pages,
+                    user_id=user_id, string=s.PRESS_TO_SHARE, title=book.title
                 ),
                 switch_pm_parameter="start",
-            )
-            return
-        query.answer(
-            results=[_get_book_article(book=book, query=query, read_at_page=page)],
-            switch_pm_text=gs(
-                user_id=user_id, string=s.PRESS_TO_SHARE, title=book.title
             ),
-            switch_pm_parameter="start",
+            StatsType.BOOKS_READ,
         )
-        repository.increase_stats(StatsType.BOOKS_READ)
-        return
 
-    title, author = data.helpers.get_title_author(query.query)
-    res, total = api.search(
-        title=title, author=author, offset=int(query.offset or 1), limit=5
-    )
-    query.answer(
-        switch_pm_text=gs(
-            user_id,
-            s.X_RESULTS_FOR_S,
-            x=total,
-            s=f"{title} - {author}" if author else title,
-        ),
-        switch_pm_parameter="start",
-        results=[
-            _get_book_article(book=book, query=query, read_at_page=1)
-            for book in (api.get_book(b.id) for b in res)
-        ],
-        next_offset=str(
-            data.helpers.get_offset(int(query.offset or 1), total, increase=5)
+    title, author = data.helpers.get_title_author(text)
+    res, total = api.search(title=title, author=author, offset=offset, limit=5)
+    return (
+        dict(
+            switch_pm_text=gs(
+                user_id,
+                s.X_RESULTS_FOR_S,
+                x=total,
+                s=f"{title} - {author}" if author else title,
+            ),
+            switch_pm_parameter="start",
+            results=[
+                _get_book_article(book=book, query=query, read_at_page=1)
+                for book in api.get_books(b.id for b in res)
+                if book is not None
+            ],
+            next_offset=str(data.helpers.get_offset(offset, total, increase=5)),
         ),
+        StatsType.INLINE_SEARCHES,
     )
-    repository.increase_stats(StatsType.INLINE_SEARCHES)
+
+
+def search_books_inline(_: Client, query: InlineQuery):
+    """
+    Search books inline
+
+    query.query format: "{title}" / "{title}:{author}"
+
+    The answers are cached by the normalized query, the offset and the user language, and Telegram may cache them
+    too (per user, since they are localized).
+    """
+    if query.offset is not None and query.offset == "0":
+        return  # No more results
+    user_id, user_lang = query.from_user.id, query.from_user.language_code
+    if not repository.is_tg_user_exists(tg_id=user_id):
+        utils.on_unregistered_user(user_lang=user_lang, query=query)
+        return
+    text, offset = " ".join(query.query.split()), int(query.offset or 1)
+    key = (text, offset, repository.get_tg_user(tg_id=user_id).lang)
+    if (cached := inline_answers.get(key)) is None:
+        cached = _get_inline_answer(query=query, text=text, offset=offset)
+        inline_answers.set(key, cached)
+    answer, stats_type = cached
+    query.answer(**answer, cache_time=INLINE_CACHE_TIME, is_personal=True)
+    if stats_type is not None:
+        repository.increase_stats(stats_type)
 
 
 def search_books_message(_: Client, msg: Message):
@@ -16,7 +16,8 @@ from tg.helpers import Menu, get_string as gs, get_string_by_lang as gsbl
 from data.callbacks import ShowBook, ReadBook, JumpToPage, BrowseType
 from data.enums import BookType, ReadMode, Language
 from data.strings import String as s  # noqa
-from data import api
+import data
+from data import api, prefetch
 from db import repository
 
 
@@ -142,6 +143,36 @@ def show_stats(_: Client, clb: CallbackQuery):
         )
 
 
+def show_cache_stats(_: Client, msg: Message):
+    """
+    Show the API caches occupancy (admins only).
+    """
+    msg.reply_text(
+        text=data.helpers.stats_to_text("API caches", api.get_cache_stats()),
+        quote=True,
+    )
+
+
+def show_upstream_stats(_: Client, msg: Message):
+    """
+    Show the upstream circuit breakers state (admins only).
+    """
+    msg.reply_text(
+        text=data.helpers.stats_to_text("Upstream", api.get_upstream_stats()),
+        quote=True,
+    )
+
+
+def show_metrics(_: Client, msg: Message):
+    """
+    Show the upstream latency percentiles (p50/p99/max) and counters per endpoint (admins only).
+    """
+    msg.reply_text(
+        text=data.helpers.stats_to_text("Upstream metrics", api.get_metrics_summary()),
+        quote=True,
+    )
+
+
 def show_book(_: Client, clb: CallbackQuery):
     """
     Show a book.
@@ -240,16 +271,10 @@ def read_book(_: Client, clb: CallbackQuery):
         masechet = api.get_masechet(int(read_clb.id))
         total = masechet.total
     elif read_clb.book_type == BookType.TURSA:
-        _previous_tursa = BrowseType.from_callback(others[0])
-        _previous_previous_tursa = BrowseType.from_callback(others[1])
-        tursa = next(
-            filter(lambda x: x.id == read_clb.id, api.get_tursa(_previous_tursa.id))
-        )
-        previous_tursa = next(
-            filter(
-                lambda x: x.id == _previous_tursa.id,
-                api.get_tursa(_previous_previous_tursa.id),
-            )
+        tursa, previous_tursa = api.get_tursa_node(
+            tursa_id=read_clb.id,
+            parent_id=BrowseType.from_callback(others[0]).id,
+            grandparent_id=BrowseType.from_callback(others[1]).id,
         )
     else:
         raise ValueError("Invalid book type")
@@ -298,7 +323,7 @@ def read_book(_: Client, clb: CallbackQuery):
                             text=gs(user_id=user_id, string=s.READ_ON_SITE),
                             url=book.get_page_url(read_clb.page)
                             if read_clb.book_type == BookType.BOOK
-                            else masechet.pages[read_clb.page - 1].get_page_url()
+                            else masechet.get_page_url(read_clb.page)
                             if read_clb.book_type == BookType.MASECHET
                             else tursa.url,
                         )
@@ -315,6 +340,21 @@ def read_book(_: Client, clb: CallbackQuery):
         repository.increase_stats(StatsType.PAGES_READ)
     except MessageNotModified:
         clb.answer(text=gs(user_id=user_id, string=s.SLOW_DOWN))
+        return
+    if read_clb.book_type == BookType.BOOK:
+        prefetch.warm_pages(
+            page=read_clb.page,
+            total=total,
+            get_url=lambda p: helpers.get_book_page_url(book, p, read_clb.read_mode),
+        )
+    elif read_clb.book_type == BookType.MASECHET:
+        prefetch.warm_pages(
+            page=read_clb.page,
+            total=total,
+            get_url=lambda p: helpers.get_masechet_page_url(
+                masechet, p, read_clb.read_mode
+            ),
+        )
 
 
 def jump_to_page(_: Client, msg: Message):
@@ -363,20 +403,13 @@ def jump_to_page(_: Client, msg: Message):
         return
     if not is_book:
         masechet = api.get_masechet(jump_clb.id)
-        try:
-            jump_to = (
-                masechet.pages.index(
-                    next(filter(lambda p: p.name == msg.text, masechet.pages))
-                )
-                + 1
-            )
-        except (StopIteration, ValueError):
+        if (jump_to := masechet.find_page(msg.text)) is None:
             msg.reply_text(
                 text=gs(
                     user_id=user_id,
                     string=s.PAGE_NOT_EXIST_CHOOSE_BETWEEN_X_Y,
-                    x=masechet.pages[0].name,
-                    y=masechet.pages[-1].name,
+                    x=masechet.page_names[0],
+                    y=masechet.page_names[-1],
                 )
             )
             return
@@ -429,7 +462,7 @@ def jump_to_page(_: Client, msg: Message):
                         text=gs(user_id=user_id, string=s.READ_ON_SITE),
                         url=book.get_page_url(jump_clb.page)
                         if is_book
-                        else masechet.pages[jump_clb.page - 1].get_page_url(),
+                        else masechet.get_page_url(jump_clb.page),
                     )
                 ],
                 [msg.reply_to_message.reply_markup.inline_keyboard[-1][-1]],
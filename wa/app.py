@@ -163,4 +163,19 @@ else:
             admins_filter,
             fil.text.command("stats", prefixes=("!", "/")),
         ),
+        MessageHandler(
+            utils.on_cache_stats_admin,
+            admins_filter,
+            fil.text.command("cache", prefixes=("!", "/")),
+        ),
+        MessageHandler(
+            utils.on_upstream_stats_admin,
+            admins_filter,
+            fil.text.command("upstream", prefixes=("!", "/")),
+        ),
+        MessageHandler(
+            utils.on_metrics_admin,
+            admins_filter,
+            fil.text.command("metrics", prefixes=("!", "/")),
+        ),
     )
@@ -125,11 +125,33 @@ def get_masechet_details(masechet: Masechet):
     return "".join(
         (
             f"📚 {masechet.name}\n",
-            f"{RTL}📖 {masechet.pages[0].name}- {masechet.pages[-1].name}\n",
+            f"{RTL}📖 {masechet.page_names[0]}- {masechet.page_names[-1]}\n",
         )
     )
 
 
+def get_book_page_url(book: Book, page: int, is_image: bool) -> str:
+    """
+    Get the url of a book page image or PDF (raises ValueError if the page doesn't exist).
+    """
+    return (
+        book.get_page_img(page=page, width=750, height=1334)
+        if is_image
+        else book.get_page_pdf(page=page)
+    )
+
+
+def get_masechet_page_url(masechet: Masechet, page: int, is_image: bool) -> str:
+    """
+    Get the url of a masechet page image or PDF (raises IndexError if the page doesn't exist).
+    """
+    return (
+        masechet.get_page_img(page, width=750, height=1334)
+        if is_image
+        else masechet.get_page_pdf(page)
+    )
+
+
 def get_file_id(wa: WhatsApp, url: str, file_name: str, mime_type: str) -> str:
     """
     Wrapper to get a file id from a url.
@@ -45,7 +45,7 @@ def on_search(_: WhatsApp, mc: Message | CallbackSelection):
         )
         return
 
-    books = (api.get_book(r.id) for r in results)
+    books = (b for b in api.get_books(r.id for r in results) if b is not None)
     sections = [
         Section(
             title=sls(gs(wa_id, s.SEARCH_RESULTS), 24),
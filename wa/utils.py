@@ -14,7 +14,8 @@ from pywa.types import (
     SectionRow,
     MessageStatus,
 )
-from data import api, config
+import data
+from data import api, config, prefetch
 from data.callbacks import ShareBook, ReadBook, ShowBook
 from data.enums import BookType, ReadMode, Language
 from data.strings import String as s  # noqa
@@ -114,7 +115,7 @@ def read_book(
     data: ReadBook | None = None,
 ) -> str | None:
     wa_id = msg_or_clb.from_user.wa_id
-    book, masechet, page = None, None, None
+    book, masechet, page_name = None, None, None
     if data is not None:
         read = data
     elif isinstance(msg_or_clb, CallbackButton):
@@ -162,11 +163,7 @@ def read_book(
             )
             return
         try:
-            url = (
-                book.get_page_img(page=read.page, width=750, height=1334)
-                if is_image
-                else book.get_page_pdf(page=read.page)
-            )
+            url = helpers.get_book_page_url(book, read.page, is_image)
         except ValueError:
             msg_or_clb.react("❌")
             msg_or_clb.reply_text(
@@ -187,24 +184,24 @@ def read_book(
             )
             return
         try:
-            page = masechet.pages[read.page - 1]
+            page_name = masechet.get_page_name(read.page)
         except IndexError:
             msg_or_clb.react("❌")
             msg_or_clb.reply_text(
                 text=gs(
                     wa_id,
                     s.PAGE_NOT_EXIST_CHOOSE_BETWEEN_X_Y,
-                    x=masechet.pages[0].name,
-                    y=masechet.pages[-1].name,
+                    x=masechet.page_names[0],
+                    y=masechet.page_names[-1],
                 ),
                 footer=gs(wa_id, s.HB_FOOTER),
                 buttons=(Button(title=gs(wa_id, s.SEARCH), callback_data=Menu.SEARCH),),
             )
             return
-        url = page.get_page_img(width=750, height=1334) if is_image else page.pdf_url
+        url = helpers.get_masechet_page_url(masechet, read.page, is_image)
 
     func = msg_or_clb.reply_image if is_image else msg_or_clb.reply_document
-    total = book.pages if is_book else len(masechet.pages)
+    total = book.pages if is_book else masechet.total
     buttons = [
         Button(
             title=sls(gs(wa_id, s.DOCUMENT if is_image else s.IMAGE), 20),
@@ -242,7 +239,7 @@ def read_book(
         file_name = (
             f"{book.title} • {book.author} ({read.page}).pdf"
             if is_book
-            else f"{masechet.name} ({page.name}).pdf"
+            else f"{masechet.name} ({page_name}).pdf"
         )
         kwargs = dict(
             document=helpers.get_file_id(
@@ -263,6 +260,13 @@ def read_book(
     message_id = func(**kwargs, footer=sls(gs(wa_id, s.HB_FOOTER), 60), caption=caption)
     MSG_TO_BOOK_CACHE[message_id] = dataclasses.replace(read, total=total)
     repository.increase_stats(StatsType.PAGES_READ)
+    prefetch.warm_pages(
+        page=read.page,
+        total=total,
+        get_url=lambda p: helpers.get_book_page_url(book, p, is_image)
+        if is_book
+        else helpers.get_masechet_page_url(masechet, p, is_image),
+    )
     return message_id
 
 
@@ -408,6 +412,22 @@ def on_stats_admin(_: WhatsApp, msg: Message):
     )
 
 
+def on_cache_stats_admin(_: WhatsApp, msg: Message):
+    msg.reply_text(text=data.helpers.stats_to_text("API caches", api.get_cache_stats()))
+
+
+def on_upstream_stats_admin(_: WhatsApp, msg: Message):
+    msg.reply_text(
+        text=data.helpers.stats_to_text("Upstream", api.get_upstream_stats())
+    )
+
+
+def on_metrics_admin(_: WhatsApp, msg: Message):
+    msg.reply_text(
+        text=data.helpers.stats_to_text("Upstream metrics", api.get_metrics_summary())
+    )
+
+
 def on_failed_message(client: WhatsApp, status: MessageStatus):
     wa_id = status.from_user.wa_id
     if isinstance(status.error, MediaUploadError):